@@ -7,23 +7,31 @@ from datetime import datetime
 import os
 import shutil
 import duckdb
+from openpyxl import Workbook
+import pyarrow as pa
+import consultas
+from medicoes import TIPOS_MEDICAO, SENTIDO_MELHORA
 
-def gerar_relatorio_paciente(paciente_id, conn):
-    """Gera um relatório detalhado do progresso do paciente"""
+def carregar_progresso_paciente(paciente_id, conn, cache=None):
+    """
+    Carrega o progresso do paciente com o nome de cada fase. É a base do
+    relatório, dos gráficos e da tabela de detalhes do paciente.
+    Se um cache for informado, o resultado é memorizado nele.
+    """
+    if cache is not None:
+        return cache.executar(conn, 'progresso_paciente', (int(paciente_id),))
+    return consultas.executar(conn, 'progresso_paciente', (int(paciente_id),)).fetchdf()
+
+def gerar_relatorio_paciente(paciente_id, conn, progresso=None):
+    """
+    Gera um relatório detalhado do progresso do paciente.
+    O progresso já carregado pode ser informado para evitar nova consulta.
+    """
     # Busca dados do paciente
-    paciente = conn.execute(f"""
-        SELECT nome, data_cirurgia, data_cadastro 
-        FROM pacientes 
-        WHERE id = {paciente_id}
-    """).fetchone()
-    
-    progresso = conn.execute(f"""
-        SELECT p.*, f.fase as nome_fase
-        FROM progresso p
-        JOIN fases_reabilitacao f ON p.fase = f.id
-        WHERE p.paciente_id = {paciente_id}
-        ORDER BY p.data_inicio
-    """).fetchdf()
+    paciente = consultas.executar(conn, 'paciente', (int(paciente_id),)).fetchone()
+    
+    if progresso is None:
+        progresso = carregar_progresso_paciente(paciente_id, conn)
     
     # Cria o relatório
     relatorio = {
@@ -37,15 +45,15 @@ def gerar_relatorio_paciente(paciente_id, conn):
     
     return relatorio
 
-def gerar_grafico_progresso(paciente_id, conn):
-    """Gera gráficos de progresso do paciente"""
-    progresso = conn.execute(f"""
-        SELECT p.*, f.fase as nome_fase
-        FROM progresso p
-        JOIN fases_reabilitacao f ON p.fase = f.id
-        WHERE p.paciente_id = {paciente_id}
-        ORDER BY p.data_inicio
-    """).fetchdf()
+def gerar_grafico_progresso(paciente_id, conn, progresso=None):
+    """
+    Gera gráficos de progresso do paciente.
+    O progresso já carregado pode ser informado para evitar nova consulta.
+    """
+    if progresso is None:
+        progresso = carregar_progresso_paciente(paciente_id, conn)
+    else:
+        progresso = progresso.copy()
     
     # Gráfico de barras para fases
     fig_fases = px.bar(progresso, 
@@ -66,69 +74,299 @@ def gerar_grafico_progresso(paciente_id, conn):
 def gerar_analise_estatistica(conn):
     """Gera análise estatística de todos os pacientes"""
     # Tempo médio por fase
-    tempo_fase = conn.execute("""
-        SELECT f.fase, 
-               AVG(DATEDIFF('day', p.data_inicio, p.data_fim)) as tempo_medio
-        FROM progresso p
-        JOIN fases_reabilitacao f ON p.fase = f.id
-        WHERE p.data_fim IS NOT NULL
-        GROUP BY f.fase
-    """).fetchdf()
+    tempo_fase = consultas.executar(conn, 'tempo_medio_fase').fetchdf()
     
     # Taxa de sucesso por fase
-    sucesso_fase = conn.execute("""
-        SELECT f.fase,
-               COUNT(CASE WHEN p.status = 'Concluído' THEN 1 END) * 100.0 / COUNT(*) as taxa_sucesso
-        FROM progresso p
-        JOIN fases_reabilitacao f ON p.fase = f.id
-        GROUP BY f.fase
-    """).fetchdf()
+    sucesso_fase = consultas.executar(conn, 'taxa_sucesso_fase').fetchdf()
     
     return tempo_fase, sucesso_fase
 
-def exportar_dados(conn, formato='excel'):
-    """Exporta dados do banco para diferentes formatos"""
-    # Busca todos os dados
-    pacientes = conn.execute("SELECT * FROM pacientes").fetchdf()
-    progresso = conn.execute("""
-        SELECT p.*, f.fase as nome_fase
-        FROM progresso p
-        JOIN fases_reabilitacao f ON p.fase = f.id
-    """).fetchdf()
+def gerar_indicadores_dashboard(conn, cache=None):
+    """
+    Retorna os indicadores do Dashboard (total, ativos, concluídos) e o
+    histograma de registros por fase a partir de uma única consulta.
+    Se um cache for informado, o resultado é memorizado nele.
+    """
+    if cache is not None:
+        agregados = cache.executar(conn, 'indicadores_dashboard')
+    else:
+        agregados = consultas.executar(conn, 'indicadores_dashboard').fetchdf()
     
-    # Cria diretório de exportação se não existir
-    if not os.path.exists('exportacoes'):
-        os.makedirs('exportacoes')
+    geral = agregados[agregados['geral'] == 1].iloc[0]
+    por_fase = agregados[(agregados['geral'] == 0) & agregados['fase'].notna()]
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return {
+        "total_pacientes": int(geral['total_pacientes']),
+        "pacientes_ativos": int(geral['ativos']),
+        "pacientes_concluidos": int(geral['concluidos']),
+        "progresso_fases": por_fase[['fase', 'total']].reset_index(drop=True)
+    }
+
+def carregar_medicoes_periodo(paciente_id, data_inicio, data_fim, conn, cache=None):
+    """
+    Carrega, em uma única consulta, as medições de todos os tipos do
+    paciente no período, com as colunas Data, Tipo (rótulo) e Valor.
+    Se um cache for informado, o resultado é memorizado nele.
+    """
+    parametros = (int(paciente_id), data_inicio, data_fim)
+    if cache is not None:
+        medicoes = cache.executar(conn, 'medicoes_periodo_todos', parametros)
+    else:
+        medicoes = consultas.executar(conn, 'medicoes_periodo_todos', parametros).fetchdf()
     
-    if formato == 'excel':
-        with pd.ExcelWriter(f'exportacoes/dados_{timestamp}.xlsx') as writer:
-            pacientes.to_excel(writer, sheet_name='Pacientes', index=False)
-            progresso.to_excel(writer, sheet_name='Progresso', index=False)
-    elif formato == 'csv':
-        pacientes.to_csv(f'exportacoes/pacientes_{timestamp}.csv', index=False)
-        progresso.to_csv(f'exportacoes/progresso_{timestamp}.csv', index=False)
+    medicoes.columns = ['Data', 'Tipo', 'Valor']
+    medicoes['Tipo'] = medicoes['Tipo'].map(TIPOS_MEDICAO)
+    return medicoes
+
+def calcular_estatisticas_medicoes(medicoes):
+    """
+    Calcula, em uma única passagem agrupada, média, máximo, mínimo,
+    primeiro e último valor e a variação percentual (do primeiro ao
+    último) de cada tipo de medição. Recebe as colunas Data, Tipo e Valor
+    e retorna um DataFrame indexado pelo tipo.
+    """
+    estatisticas = (
+        medicoes.sort_values('Data', kind='stable')
+        .groupby('Tipo', sort=False)['Valor']
+        .agg(media='mean', maximo='max', minimo='min', primeiro='first', ultimo='last')
+    )
+    estatisticas['variacao'] = (
+        (estatisticas['ultimo'] - estatisticas['primeiro']) / estatisticas['primeiro'] * 100
+    )
+    return estatisticas
+
+# Quantis 0,975 da t de Student para 1 a 3 graus de liberdade; acima disso
+# a expansão de Cornish-Fisher usada em _quantil_t erra menos de 0,01
+QUANTIS_T_975 = {1: 12.706, 2: 4.303, 3: 3.182}
+
+def _quantil_t(graus):
+    """Quantil 0,975 da t de Student para um vetor de graus de liberdade"""
+    graus = np.asarray(graus, dtype=float)
+    z = 1.959964
+    quantil = (z + (z**3 + z) / (4 * graus)
+               + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * graus**2)
+               + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * graus**3))
+    for g, valor in QUANTIS_T_975.items():
+        quantil = np.where(graus == g, valor, quantil)
+    return quantil
+
+def _intervalos_inclinacao(n, inclinacao, sxx, syy, sxy):
+    """
+    Calcula, de forma vetorizada, o intervalo de confiança de 95% da
+    inclinação a partir das somas de quadrados da regressão. Séries com
+    menos de 3 medições ficam sem intervalo (NaN).
+    """
+    n = np.asarray(n, dtype=float)
+    graus = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residuo = np.clip(np.asarray(syy) - np.asarray(inclinacao) * np.asarray(sxy), 0, None)
+        erro_padrao = np.sqrt(residuo / graus / np.asarray(sxx))
+        erro_padrao = np.where(graus > 0, erro_padrao, np.nan)
+        margem = np.where(graus > 0, _quantil_t(np.maximum(graus, 1)) * erro_padrao, np.nan)
+    return inclinacao - margem, inclinacao + margem
+
+def calcular_tendencias(conn, cache=None):
+    """
+    Ajusta, em uma única consulta agrupada, a reta de mínimos quadrados do
+    valor pelos dias para cada paciente e tipo de medição. Retorna a
+    inclinação (por dia), o R², o intervalo de confiança de 95% da
+    inclinação e a melhora semanal (inclinação no sentido de melhora do
+    tipo), com o tipo já como rótulo.
+    Se um cache for informado, o resultado é memorizado nele.
+    """
+    if cache is not None:
+        tendencias = cache.executar(conn, 'tendencias_medicoes')
+    else:
+        tendencias = consultas.executar(conn, 'tendencias_medicoes').fetchdf()
     
-    return f'exportacoes/dados_{timestamp}.{formato}'
+    tendencias['ic_inferior'], tendencias['ic_superior'] = _intervalos_inclinacao(
+        tendencias['n'], tendencias['inclinacao'],
+        tendencias['sxx'], tendencias['syy'], tendencias['sxy']
+    )
+    tendencias['melhora_semanal'] = tendencias['inclinacao'] * 7 * tendencias['tipo'].map(SENTIDO_MELHORA)
+    # Significativa quando o intervalo não contém o zero
+    tendencias['significativa'] = (tendencias['ic_inferior'] > 0) | (tendencias['ic_superior'] < 0)
+    tendencias['tipo'] = tendencias['tipo'].map(TIPOS_MEDICAO)
+    return tendencias.drop(columns=['sxx', 'syy', 'sxy'])
+
+def ajustar_tendencia(medicoes):
+    """
+    Ajusta a reta de mínimos quadrados de uma série de medições (colunas
+    Data e Valor), com x em dias. Retorna a inclinação por dia, o R² e o
+    intervalo de confiança de 95% da inclinação.
+    """
+    dias = medicoes['Data'].to_numpy(dtype='datetime64[s]').astype(float) / 86400.0
+    valores = medicoes['Valor'].to_numpy(dtype=float)
+    n = len(valores)
+    dx = dias - dias.mean() if n else dias
+    dy = valores - valores.mean() if n else valores
+    sxx, syy, sxy = (dx * dx).sum(), (dy * dy).sum(), (dx * dy).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inclinacao = sxy / sxx if sxx > 0 else np.nan
+        r2 = sxy * sxy / (sxx * syy) if sxx > 0 and syy > 0 else np.nan
+    ic_inferior, ic_superior = _intervalos_inclinacao(n, inclinacao, sxx, syy, sxy)
+    return {
+        'inclinacao': inclinacao,
+        'r2': r2,
+        'ic_inferior': float(ic_inferior),
+        'ic_superior': float(ic_superior)
+    }
 
-def fazer_backup(conn):
-    """Realiza backup do banco de dados"""
-    if not os.path.exists('backups'):
-        os.makedirs('backups')
+# Máximo de pontos por série enviados a cada gráfico
+PONTOS_GRAFICO = 1000
+
+def _indices_lttb(x, y, limite):
+    """
+    Seleciona os índices de até limite pontos da série pelo algoritmo
+    Largest-Triangle-Three-Buckets: o primeiro e o último ponto são mantidos
+    e, de cada balde intermediário, fica o ponto que forma o maior triângulo
+    com o ponto escolhido no balde anterior e a média do balde seguinte.
+    """
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+    
+    bordas = np.linspace(1, n - 1, limite - 1).astype(int)
+    indices = np.empty(limite, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for i in range(limite - 2):
+        inicio, fim = bordas[i], bordas[i + 1]
+        fim_seguinte = bordas[i + 2] if i + 2 < len(bordas) else n
+        media_x = x[fim:fim_seguinte].mean()
+        media_y = y[fim:fim_seguinte].mean()
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(areas.argmax())
+        indices[i + 1] = anterior
+    return indices
+
+def reduzir_pontos(dados, limite=PONTOS_GRAFICO):
+    """
+    Reduz os dados de um gráfico (DataFrame indexado pela data, uma coluna
+    por série) escolhendo até limite pontos de cada série, preservando o
+    formato da curva (LTTB). As linhas mantidas são a união das escolhidas
+    em cada série, e os dados são retornados sem cópia quando já cabem no
+    limite.
+    """
+    if len(dados) <= limite:
+        return dados
+    
+    x = dados.index.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+    manter = np.zeros(len(dados), dtype=bool)
+    for coluna in dados.columns:
+        valores = dados[coluna].to_numpy(dtype=float)
+        posicoes = np.flatnonzero(~np.isnan(valores))
+        manter[posicoes[_indices_lttb(x[posicoes], valores[posicoes], limite)]] = True
+    return dados[manter]
+
+# Tabelas exportadas: (nome da aba/arquivo, consulta registrada)
+TABELAS_EXPORTACAO = [
+    ('pacientes', 'pacientes'),
+    ('progresso', 'progresso_completo')
+]
+
+def _exportar_excel(conn, caminho, tamanho_lote, progredir):
+    """Escreve as tabelas no Excel lote a lote, com o openpyxl em modo somente escrita"""
+    total = sum(consultas.executar(conn, 'contagem_exportacao').fetchone())
+    escritos = 0
+    
+    workbook = Workbook(write_only=True)
+    for nome, consulta in TABELAS_EXPORTACAO:
+        aba = workbook.create_sheet(nome.capitalize())
+        lotes = consultas.executar(conn, consulta).fetch_record_batch(tamanho_lote)
+        aba.append(lotes.schema.names)
+        for lote in lotes:
+            for linha in zip(*(coluna.to_pylist() for coluna in lote.columns)):
+                aba.append(linha)
+            escritos += lote.num_rows
+            progredir(min(escritos / total, 1.0), f"{escritos} de {total} registros exportados")
+    workbook.save(caminho)
+
+def _exportar_feather(conn, consulta, caminho, tamanho_lote):
+    """Escreve a consulta em Arrow IPC (Feather v2) com zstd, lote a lote, sem passar pelo pandas"""
+    lotes = consultas.executar(conn, consulta).fetch_record_batch(tamanho_lote)
+    opcoes = pa.ipc.IpcWriteOptions(compression='zstd')
+    with pa.ipc.new_file(caminho, lotes.schema, options=opcoes) as escritor:
+        for lote in lotes:
+            escritor.write_batch(lote)
+
+# Colunas pelas quais o Parquet de progresso pode ser particionado, com a
+# expressão que gera a coluna (None quando ela já existe na consulta)
+PARTICOES_PROGRESSO = {
+    'fase': None,
+    'ano': "year(data_inicio) AS ano"
+}
+
+def _novo_caminho_exportacao(diretorio, nome, timestamp, extensao=''):
+    """Caminho ainda inexistente, com sufixo _002, _003, ... se já houver outro no mesmo segundo"""
+    caminho = f'{diretorio}/{nome}_{timestamp}{extensao}'
+    sufixo = 1
+    while os.path.exists(caminho):
+        sufixo += 1
+        caminho = f'{diretorio}/{nome}_{timestamp}_{sufixo:03d}{extensao}'
+    return caminho
+
+def exportar_dados(conn, formato='excel', tamanho_lote=10000, ao_progredir=None,
+                   particionar_por=None, diretorio='exportacoes'):
+    """
+    Exporta dados do banco para diferentes formatos sem carregar as tabelas
+    inteiras na memória. CSV e Parquet são escritos pelo próprio DuckDB
+    (COPY ... TO); Excel e Feather são escritos em lotes de registros Arrow.
+    O Parquet usa compressão zstd e o progresso pode ser particionado por
+    'fase' ou 'ano' de início (particionar_por), gerando um diretório.
+    ao_progredir(fracao, mensagem) é chamada conforme a exportação avança.
+    Retorna os caminhos dos arquivos gerados.
+    """
+    # Cria diretório de exportação se não existir
+    if not os.path.exists(diretorio):
+        os.makedirs(diretorio)
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_path = f'backups/backup_{timestamp}.db'
     
-    # Cria uma nova conexão para o backup
-    backup_conn = duckdb.connect(backup_path)
+    def progredir(fracao, mensagem):
+        if ao_progredir is not None:
+            ao_progredir(fracao, mensagem)
     
-    # Copia todas as tabelas
-    backup_conn.execute("""
-        CREATE TABLE pacientes AS SELECT * FROM conn.pacientes;
-        CREATE TABLE progresso AS SELECT * FROM conn.progresso;
-        CREATE TABLE fases_reabilitacao AS SELECT * FROM conn.fases_reabilitacao;
-    """)
+    if formato == 'excel':
+        caminhos = [_novo_caminho_exportacao(diretorio, 'dados', timestamp, '.xlsx')]
+        _exportar_excel(conn, caminhos[0], tamanho_lote, progredir)
+    elif formato == 'csv':
+        caminhos = []
+        for i, (nome, consulta) in enumerate(TABELAS_EXPORTACAO):
+            caminho = _novo_caminho_exportacao(diretorio, nome, timestamp, '.csv')
+            conn.execute(f"COPY ({consultas.CONSULTAS[consulta]}) TO '{caminho}' (HEADER, DELIMITER ',')")
+            caminhos.append(caminho)
+            progredir((i + 1) / len(TABELAS_EXPORTACAO), f"Tabela {nome} exportada")
+    elif formato == 'parquet':
+        caminhos = []
+        for i, (nome, consulta) in enumerate(TABELAS_EXPORTACAO):
+            sql = consultas.CONSULTAS[consulta]
+            if nome == 'progresso' and particionar_por is not None:
+                if particionar_por not in PARTICOES_PROGRESSO:
+                    raise ValueError(f"Partição não suportada: {particionar_por}")
+                expressao = PARTICOES_PROGRESSO[particionar_por]
+                if expressao is not None:
+                    sql = f"SELECT *, {expressao} FROM ({sql})"
+                caminho = _novo_caminho_exportacao(diretorio, nome, timestamp)
+                opcoes = f"(FORMAT PARQUET, COMPRESSION ZSTD, PARTITION_BY ({particionar_por}))"
+            else:
+                caminho = _novo_caminho_exportacao(diretorio, nome, timestamp, '.parquet')
+                opcoes = "(FORMAT PARQUET, COMPRESSION ZSTD)"
+            conn.execute(f"COPY ({sql}) TO '{caminho}' {opcoes}")
+            caminhos.append(caminho)
+            progredir((i + 1) / len(TABELAS_EXPORTACAO), f"Tabela {nome} exportada")
+    elif formato == 'feather':
+        caminhos = []
+        for i, (nome, consulta) in enumerate(TABELAS_EXPORTACAO):
+            caminho = _novo_caminho_exportacao(diretorio, nome, timestamp, '.feather')
+            _exportar_feather(conn, consulta, caminho, tamanho_lote)
+            caminhos.append(caminho)
+            progredir((i + 1) / len(TABELAS_EXPORTACAO), f"Tabela {nome} exportada")
+    else:
+        raise ValueError(f"Formato de exportação não suportado: {formato}")
     
-    backup_conn.close()
-    return backup_path 
\ No newline at end of file
+    progredir(1.0, "Exportação concluída")
+    return caminhos
@@ -0,0 +1,476 @@
+"""
+Backup e restauração do banco de dados.
+
+Cada backup é um diretório em backups/ com um manifesto.json que guarda a
+soma SHA-256 de cada arquivo, a contagem de registros e o tempo gasto.
+
+- Backup completo: EXPORT DATABASE do DuckDB em Parquet (schema.sql,
+  load.sql e um arquivo por tabela).
+- Backup incremental: um Parquet por tabela com os registros cujo id passou
+  da marca (maior id) do backup anterior. O sistema só insere registros em
+  pacientes, progresso e medicoes, por isso a marca de id basta para
+  capturar as mudanças.
+
+A restauração de um incremental aplica o backup completo em que ele se
+baseia e todos os incrementais da cadeia até ele.
+
+O AgendadorBackup executa os backups em uma thread própria, no intervalo
+definido em config.yaml (backup.intervalo_minutos), e também atende os
+pedidos manuais da página Backup, sem bloquear a interface.
+
+Uso: python backup.py completo|incremental|retencao|restaurar <caminho>
+"""
+import os
+import re
+import sys
+import json
+import time
+import queue
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+import duckdb
+from banco import SEQUENCIAS, carregar_config, obter_gerenciador, obter_cache, desfazer_transacao
+
+DIRETORIO_BACKUPS = 'backups'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+# Tabelas copiadas pelos backups incrementais (as demais só mudam por migração)
+TABELAS_INCREMENTAIS = ['pacientes', 'progresso', 'medicoes']
+
+# Impede que um backup e uma restauração rodem ao mesmo tempo
+_lock_operacao = threading.Lock()
+
+def sha256_arquivo(caminho):
+    """Calcula a soma SHA-256 de um arquivo lendo-o em blocos"""
+    soma = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            soma.update(bloco)
+    return soma.hexdigest()
+
+def _arquivos_tabelas(caminho_backup):
+    """Lê o load.sql do backup e retorna [(tabela, arquivo)] na ordem de carga"""
+    with open(os.path.join(caminho_backup, 'load.sql'), 'r') as f:
+        comandos = re.findall(r"COPY\s+(\S+)\s+FROM\s+'([^']+)'", f.read())
+    # Os caminhos no load.sql são os da exportação; usa o diretório atual do backup
+    return [(tabela, os.path.join(caminho_backup, os.path.basename(arquivo)))
+            for tabela, arquivo in comandos]
+
+def _novo_caminho_backup(diretorio):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    caminho = os.path.join(diretorio, f'backup_{timestamp}')
+    sufixo = 1
+    while os.path.exists(caminho):
+        sufixo += 1
+        caminho = os.path.join(diretorio, f'backup_{timestamp}_{sufixo:03d}')
+    return caminho
+
+def _salvar_manifesto(caminho_backup, manifesto):
+    with open(os.path.join(caminho_backup, ARQUIVO_MANIFESTO), 'w') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+
+def ler_manifesto(caminho_backup):
+    """Retorna o manifesto de um backup"""
+    with open(os.path.join(caminho_backup, ARQUIVO_MANIFESTO), 'r') as f:
+        return json.load(f)
+
+def _resumir_arquivos(caminho_backup):
+    """Retorna as somas SHA-256 e o tamanho total dos arquivos do backup"""
+    arquivos = {
+        nome: sha256_arquivo(os.path.join(caminho_backup, nome))
+        for nome in sorted(os.listdir(caminho_backup))
+    }
+    tamanho = sum(os.path.getsize(os.path.join(caminho_backup, nome)) for nome in arquivos)
+    return arquivos, tamanho
+
+def fazer_backup(conn, diretorio=DIRETORIO_BACKUPS):
+    """
+    Realiza backup completo do banco e retorna o caminho do backup.
+    O EXPORT DATABASE lê todas as tabelas em uma única transação, o que
+    garante um retrato consistente do banco.
+    """
+    inicio = time.perf_counter()
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_backup = _novo_caminho_backup(diretorio)
+
+    conn.execute(f"EXPORT DATABASE '{caminho_backup}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+
+    registros = {}
+    marcas = {}
+    for tabela, arquivo in _arquivos_tabelas(caminho_backup):
+        registros[tabela] = conn.execute(
+            f"SELECT COUNT(*) FROM read_parquet('{arquivo}')"
+        ).fetchone()[0]
+        if tabela in TABELAS_INCREMENTAIS:
+            marcas[tabela] = conn.execute(
+                f"SELECT COALESCE(MAX(id), 0) FROM read_parquet('{arquivo}')"
+            ).fetchone()[0]
+    arquivos, tamanho = _resumir_arquivos(caminho_backup)
+
+    manifesto = {
+        'tipo': 'completo',
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'duracao_s': round(time.perf_counter() - inicio, 3),
+        'tamanho_bytes': tamanho,
+        'registros': registros,
+        'marcas': marcas,
+        'arquivos': arquivos
+    }
+    _salvar_manifesto(caminho_backup, manifesto)
+    logging.info(f"Backup {caminho_backup} concluído em {manifesto['duracao_s']} s")
+    return caminho_backup
+
+def _ultima_cadeia(diretorio):
+    """Retorna o último backup completo e seus incrementais, em ordem"""
+    completos = [c for c in listar_backups(diretorio) if ler_manifesto(c)['tipo'] == 'completo']
+    if not completos:
+        return None, []
+    base = completos[0]
+    return base, _incrementais_da_base(diretorio, base)
+
+def _incrementais_da_base(diretorio, base):
+    """Incrementais baseados no backup completo informado, do mais antigo ao mais recente"""
+    return sorted(
+        caminho for caminho in listar_backups(diretorio)
+        if ler_manifesto(caminho).get('base') == os.path.basename(base)
+    )
+
+def fazer_backup_incremental(conn, diretorio=DIRETORIO_BACKUPS):
+    """
+    Grava apenas os registros novos desde o último backup da cadeia e
+    retorna o caminho do backup. Sem um backup completo anterior, ou se
+    uma tabela incremental foi criada depois dele, faz um backup completo.
+    """
+    base, incrementais = _ultima_cadeia(diretorio)
+    if base is None:
+        return fazer_backup(conn, diretorio)
+    anterior = ler_manifesto(incrementais[-1] if incrementais else base)
+    if any(tabela not in anterior['marcas'] for tabela in TABELAS_INCREMENTAIS):
+        return fazer_backup(conn, diretorio)
+
+    inicio = time.perf_counter()
+    caminho_backup = _novo_caminho_backup(diretorio)
+    os.makedirs(caminho_backup)
+
+    registros = {}
+    marcas = {}
+    # Uma única transação garante que todas as tabelas vêm do mesmo retrato
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        for tabela in TABELAS_INCREMENTAIS:
+            marca_anterior = int(anterior['marcas'][tabela])
+            registros[tabela], marcas[tabela] = conn.execute(
+                f"SELECT COUNT(*), COALESCE(MAX(id), {marca_anterior}) FROM {tabela} WHERE id > {marca_anterior}"
+            ).fetchone()
+            conn.execute(f"""
+                COPY (SELECT * FROM {tabela} WHERE id > {marca_anterior} ORDER BY id)
+                TO '{os.path.join(caminho_backup, tabela + '.parquet')}'
+                (FORMAT PARQUET, COMPRESSION ZSTD)
+            """)
+        conn.execute("COMMIT")
+    except Exception:
+        desfazer_transacao(conn)
+        shutil.rmtree(caminho_backup, ignore_errors=True)
+        raise
+    arquivos, tamanho = _resumir_arquivos(caminho_backup)
+
+    manifesto = {
+        'tipo': 'incremental',
+        'base': os.path.basename(base),
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'duracao_s': round(time.perf_counter() - inicio, 3),
+        'tamanho_bytes': tamanho,
+        'registros': registros,
+        'marcas': marcas,
+        'arquivos': arquivos
+    }
+    _salvar_manifesto(caminho_backup, manifesto)
+    logging.info(f"Backup incremental {caminho_backup} concluído em {manifesto['duracao_s']} s")
+    return caminho_backup
+
+def aplicar_retencao(diretorio=DIRETORIO_BACKUPS, diarios=7, semanais=4, mensais=12):
+    """
+    Política avô-pai-filho (GFS): mantém o último backup completo de cada um
+    dos últimos dias, semanas e meses com backup, e remove os demais junto
+    com seus incrementais. O backup completo mais recente é sempre mantido.
+    Retorna os caminhos removidos.
+    """
+    completos = [c for c in listar_backups(diretorio) if ler_manifesto(c)['tipo'] == 'completo']
+    manter = set(completos[:1])
+    periodos = {'dia': set(), 'semana': set(), 'mes': set()}
+    limites = {'dia': diarios, 'semana': semanais, 'mes': mensais}
+
+    for caminho in completos:
+        criado_em = datetime.fromisoformat(ler_manifesto(caminho)['criado_em'])
+        chaves = {
+            'dia': criado_em.date(),
+            'semana': criado_em.isocalendar()[:2],
+            'mes': (criado_em.year, criado_em.month)
+        }
+        for periodo, chave in chaves.items():
+            if chave not in periodos[periodo] and len(periodos[periodo]) < limites[periodo]:
+                periodos[periodo].add(chave)
+                manter.add(caminho)
+
+    removidos = []
+    for caminho in listar_backups(diretorio):
+        manifesto = ler_manifesto(caminho)
+        if manifesto['tipo'] == 'completo':
+            remover = caminho not in manter
+        else:
+            remover = os.path.join(diretorio, manifesto['base']) not in manter
+        if remover:
+            shutil.rmtree(caminho)
+            removidos.append(caminho)
+    return removidos
+
+def realizar_backup(conn, tipo='completo', diretorio=DIRETORIO_BACKUPS):
+    """
+    Faz um backup completo ou incremental e aplica a política de retenção
+    definida em config.yaml (backup.retencao). Retorna o caminho do backup.
+    """
+    with _lock_operacao:
+        if tipo == 'incremental':
+            caminho_backup = fazer_backup_incremental(conn, diretorio)
+        else:
+            caminho_backup = fazer_backup(conn, diretorio)
+
+        retencao = carregar_config().get('backup', {}).get('retencao', {})
+        for removido in aplicar_retencao(diretorio, **retencao):
+            logging.info(f"Backup {removido} removido pela política de retenção")
+    return caminho_backup
+
+def listar_backups(diretorio=DIRETORIO_BACKUPS):
+    """Retorna os caminhos dos backups com manifesto, do mais recente ao mais antigo"""
+    if not os.path.exists(diretorio):
+        return []
+    backups = [
+        os.path.join(diretorio, nome) for nome in os.listdir(diretorio)
+        if os.path.exists(os.path.join(diretorio, nome, ARQUIVO_MANIFESTO))
+    ]
+    return sorted(backups, reverse=True)
+
+def cadeia_backup(caminho_backup):
+    """Retorna o backup completo e os incrementais necessários para restaurar o backup"""
+    manifesto = ler_manifesto(caminho_backup)
+    if manifesto['tipo'] == 'completo':
+        return caminho_backup, []
+    diretorio = os.path.dirname(caminho_backup)
+    base = os.path.join(diretorio, manifesto['base'])
+    if not os.path.exists(os.path.join(base, ARQUIVO_MANIFESTO)):
+        raise ValueError(f"Backup completo {manifesto['base']} não encontrado")
+    incrementais = [
+        caminho for caminho in _incrementais_da_base(diretorio, base)
+        if os.path.basename(caminho) <= os.path.basename(caminho_backup)
+    ]
+    return base, incrementais
+
+def verificar_backup(caminho_backup):
+    """Confere as somas SHA-256 do backup e retorna os arquivos ausentes ou divergentes"""
+    manifesto = ler_manifesto(caminho_backup)
+    divergentes = []
+    for nome, soma in manifesto['arquivos'].items():
+        caminho = os.path.join(caminho_backup, nome)
+        if not os.path.exists(caminho) or sha256_arquivo(caminho) != soma:
+            divergentes.append(nome)
+    return divergentes
+
+def _importar_backup(conn, caminho_backup, incrementais=()):
+    """
+    Recria o schema e carrega as tabelas de um backup completo em um banco
+    vazio, aplicando em seguida os incrementais informados
+    """
+    with open(os.path.join(caminho_backup, 'schema.sql'), 'r') as f:
+        schema = f.read()
+
+    # As sequências precisam continuar após o último id dos incrementais
+    if incrementais:
+        marcas = ler_manifesto(incrementais[-1])['marcas']
+        for tabela, sequencia in SEQUENCIAS.items():
+            if tabela in marcas:
+                schema = re.sub(
+                    rf"(CREATE SEQUENCE {sequencia}\b[^;]*?START )(\d+)",
+                    lambda m: m.group(1) + str(max(int(m.group(2)), int(marcas[tabela]) + 1)),
+                    schema
+                )
+
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        if schema.strip():
+            conn.execute(schema)
+        for tabela, arquivo in _arquivos_tabelas(caminho_backup):
+            conn.execute(f"COPY {tabela} FROM '{arquivo}' (FORMAT PARQUET)")
+        for incremental in incrementais:
+            for tabela in ler_manifesto(incremental)['registros']:
+                arquivo = os.path.join(incremental, tabela + '.parquet')
+                conn.execute(f"INSERT INTO {tabela} SELECT * FROM read_parquet('{arquivo}')")
+        conn.execute("COMMIT")
+    except Exception:
+        desfazer_transacao(conn)
+        raise
+
+def restaurar_backup(caminho_backup, gerenciador=None):
+    """
+    Restaura um backup (completo ou incremental), substituindo o banco atual.
+    As somas de verificação de toda a cadeia são conferidas antes, e o banco
+    restaurado é montado em um arquivo separado, de modo que uma falha não
+    afeta o banco em uso.
+    """
+    base, incrementais = cadeia_backup(caminho_backup)
+    for caminho in [base] + incrementais:
+        divergentes = verificar_backup(caminho)
+        if divergentes:
+            raise ValueError(
+                f"Backup {caminho} corrompido, arquivos divergentes: {', '.join(divergentes)}"
+            )
+
+    inicio = time.perf_counter()
+    gerenciador = gerenciador or obter_gerenciador()
+    caminho_temporario = gerenciador.caminho_banco + '.restaurando'
+
+    with _lock_operacao:
+        for caminho in (caminho_temporario, caminho_temporario + '.wal'):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+        conn = duckdb.connect(caminho_temporario)
+        try:
+            _importar_backup(conn, base, incrementais)
+        finally:
+            conn.close()
+
+        gerenciador.substituir_banco(caminho_temporario)
+        obter_cache().invalidar()
+
+        # Os ids dos registros inseridos daqui em diante podem repetir os de
+        # incrementais posteriores ao backup restaurado; um backup completo
+        # inicia uma nova cadeia
+        cursor = gerenciador.cursor()
+        try:
+            fazer_backup(cursor, os.path.dirname(caminho_backup))
+        finally:
+            cursor.close()
+
+    duracao = time.perf_counter() - inicio
+    logging.info(f"Backup {caminho_backup} restaurado em {duracao:.3f} s")
+    return duracao
+
+class AgendadorBackup:
+    """
+    Executa backups em uma thread de fundo: periodicamente, a cada
+    intervalo_minutos (0 desativa), e sob demanda, pelos pedidos enfileirados
+    com solicitar(). Cada backup usa um cursor próprio, e o DuckDB continua
+    atendendo as sessões enquanto o retrato é gravado.
+    """
+
+    def __init__(self, intervalo_minutos=0, tipo_agendado='incremental', diretorio=DIRETORIO_BACKUPS):
+        self.intervalo_minutos = intervalo_minutos
+        self.tipo_agendado = tipo_agendado
+        self.diretorio = diretorio
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._status = {
+            'em_execucao': False,
+            'ultimo_tipo': None,
+            'ultimo_inicio': None,
+            'ultima_duracao_s': None,
+            'ultimo_resultado': None,
+            'ultimo_caminho': None,
+            'proximo_agendado': None
+        }
+        self._proximo = self._calcular_proximo()
+        self._thread = threading.Thread(target=self._executar, name='agendador-backup', daemon=True)
+        self._thread.start()
+
+    def _calcular_proximo(self):
+        if not self.intervalo_minutos:
+            return None
+        return time.time() + self.intervalo_minutos * 60
+
+    def solicitar(self, tipo='completo'):
+        """Enfileira um backup manual e retorna a posição na fila"""
+        self._fila.put(tipo)
+        return self._fila.qsize()
+
+    def status(self):
+        """Retorna a situação do último backup, da fila e do próximo agendamento"""
+        with self._lock:
+            status = dict(self._status)
+        status['pendentes'] = self._fila.qsize()
+        if self._proximo is not None:
+            status['proximo_agendado'] = datetime.fromtimestamp(self._proximo).isoformat(timespec='seconds')
+        return status
+
+    def _executar(self):
+        while True:
+            espera = None if self._proximo is None else max(self._proximo - time.time(), 0)
+            try:
+                tipo = self._fila.get(timeout=espera)
+            except queue.Empty:
+                tipo = self.tipo_agendado
+                self._proximo = self._calcular_proximo()
+            self._fazer_backup(tipo)
+
+    def _fazer_backup(self, tipo):
+        with self._lock:
+            self._status.update({
+                'em_execucao': True,
+                'ultimo_tipo': tipo,
+                'ultimo_inicio': datetime.now().isoformat(timespec='seconds')
+            })
+        inicio = time.perf_counter()
+        try:
+            cursor = obter_gerenciador().cursor()
+            try:
+                caminho = realizar_backup(cursor, tipo, self.diretorio)
+            finally:
+                cursor.close()
+            resultado = 'sucesso'
+        except Exception as e:
+            logging.error(f"Erro no backup agendado: {e}")
+            caminho = None
+            resultado = f"erro: {e}"
+        with self._lock:
+            self._status.update({
+                'em_execucao': False,
+                'ultima_duracao_s': round(time.perf_counter() - inicio, 3),
+                'ultimo_resultado': resultado,
+                'ultimo_caminho': caminho
+            })
+
+_agendador = None
+_agendador_lock = threading.Lock()
+
+def obter_agendador(caminho_config='config.yaml'):
+    """Retorna o agendador de backups do processo, iniciando-o na primeira chamada"""
+    global _agendador
+    if _agendador is None:
+        with _agendador_lock:
+            if _agendador is None:
+                config_backup = carregar_config(caminho_config).get('backup', {})
+                _agendador = AgendadorBackup(
+                    intervalo_minutos=config_backup.get('intervalo_minutos', 0),
+                    tipo_agendado=config_backup.get('tipo_agendado', 'incremental')
+                )
+    return _agendador
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'completo'
+
+    if comando in ('completo', 'incremental'):
+        cursor = obter_gerenciador().cursor()
+        print(realizar_backup(cursor, comando))
+    elif comando == 'retencao':
+        retencao = carregar_config().get('backup', {}).get('retencao', {})
+        for removido in aplicar_retencao(**retencao):
+            print(f"Removido: {removido}")
+    elif comando == 'restaurar' and len(sys.argv) > 2:
+        duracao = restaurar_backup(sys.argv[2])
+        print(f"Backup {sys.argv[2]} restaurado em {duracao:.3f} s")
+    else:
+        print(__doc__)
+        sys.exit(1)
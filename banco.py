@@ -0,0 +1,424 @@
+import os
+import functools
+import threading
+import time
+import weakref
+import logging
+from collections import OrderedDict
+import duckdb
+import yaml
+import consultas
+
+# Tabelas mínimas para o sistema funcionar
+TABELAS_NECESSARIAS = ['fases_reabilitacao', 'pacientes', 'progresso']
+
+# Sequência que gera o ID de cada tabela
+SEQUENCIAS = {
+    'pacientes': 'seq_pacientes',
+    'progresso': 'seq_progresso',
+    'medicoes': 'seq_medicoes'
+}
+
+CAMINHO_SCHEMA = 'schema.sql'
+
+def _migracao_schema_inicial(conn):
+    """Cria as tabelas a partir do schema.sql se alguma estiver faltando"""
+    tabelas = conn.execute("""
+        SELECT table_name
+        FROM information_schema.tables
+    """).fetchall()
+    tabelas_existentes = [t[0] for t in tabelas]
+
+    if all(tabela in tabelas_existentes for tabela in TABELAS_NECESSARIAS):
+        return
+
+    with open(CAMINHO_SCHEMA, 'r') as f:
+        conn.execute(f.read())
+
+def _migracao_sequencias(conn):
+    """
+    Cria as sequências de ID em bancos antigos, que geravam os IDs com
+    MAX(id) + 1. Cada sequência começa após o maior ID já existente.
+    """
+    for tabela in ('pacientes', 'progresso'):
+        sequencia = SEQUENCIAS[tabela]
+        existe = conn.execute("""
+            SELECT COUNT(*)
+            FROM duckdb_sequences()
+            WHERE sequence_name = ?
+        """, (sequencia,)).fetchone()[0]
+        if existe:
+            continue
+
+        proximo_id = conn.execute(
+            f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabela}"
+        ).fetchone()[0]
+        conn.execute(f"CREATE SEQUENCE {sequencia} START {int(proximo_id)}")
+        conn.execute(
+            f"ALTER TABLE {tabela} ALTER COLUMN id SET DEFAULT nextval('{sequencia}')"
+        )
+
+def _migracao_indices_progresso(conn):
+    """
+    Índices para as consultas por paciente e por fase. O DuckDB só usa
+    índices ART de uma coluna em buscas por igualdade, por isso o índice
+    é sobre paciente_id (a ordenação por data_inicio é feita após a busca).
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_progresso_paciente ON progresso(paciente_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_progresso_fase ON progresso(fase)")
+
+def _migracao_tabelas_protocolos(conn):
+    """Tabelas com o conteúdo das planilhas de protocolo (ver protocolos.py)"""
+    conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_protocolos START 1")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS protocolos (
+            id INTEGER PRIMARY KEY DEFAULT nextval('seq_protocolos'),
+            arquivo TEXT NOT NULL UNIQUE,
+            titulo TEXT,
+            tamanho_bytes BIGINT,
+            mtime DOUBLE,
+            hash TEXT,
+            importado_em TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS protocolo_fases (
+            protocolo_id INTEGER,
+            ordem INTEGER,
+            fase TEXT,
+            descricao TEXT,
+            microciclo_inicio INTEGER,
+            microciclo_fim INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS protocolo_exercicios (
+            protocolo_id INTEGER,
+            linha INTEGER,
+            area TEXT,
+            exercicio TEXT,
+            fase TEXT,
+            microciclo INTEGER,
+            prescricao TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS protocolo_criterios (
+            protocolo_id INTEGER,
+            linha INTEGER,
+            criterio TEXT,
+            microciclo INTEGER,
+            descricao TEXT
+        )
+    """)
+    for tabela in ('protocolo_fases', 'protocolo_exercicios', 'protocolo_criterios'):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_protocolo ON {tabela}(protocolo_id)")
+
+def _migracao_tabela_medicoes(conn):
+    """
+    Medições dos atletas (ver medicoes.py). Todas as consultas filtram por
+    paciente, daí o índice sobre paciente_id (ver python benchmark.py medicoes).
+    """
+    conn.execute("CREATE SEQUENCE IF NOT EXISTS seq_medicoes START 1")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS medicoes (
+            id INTEGER PRIMARY KEY DEFAULT nextval('seq_medicoes'),
+            paciente_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            data TIMESTAMP NOT NULL,
+            valor DOUBLE,
+            FOREIGN KEY (paciente_id) REFERENCES pacientes(id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicoes_paciente ON medicoes(paciente_id)")
+
+def _migracao_remover_indice_fase(conn):
+    """
+    Remove o índice de fase da migração 3: o planejador nunca o usa (só há
+    cinco fases), mas ele precisa ser atualizado a cada escrita. O índice
+    de paciente_id é mantido (ver python benchmark.py indices).
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_progresso_fase")
+
+# Migrações do banco, aplicadas em ordem de versão. Novas migrações
+# devem ser adicionadas ao final, com a próxima versão.
+MIGRACOES = [
+    (1, 'schema_inicial', _migracao_schema_inicial),
+    (2, 'sequencias_ids', _migracao_sequencias),
+    (3, 'indices_progresso', _migracao_indices_progresso),
+    (4, 'tabelas_protocolos', _migracao_tabelas_protocolos),
+    (5, 'tabela_medicoes', _migracao_tabela_medicoes),
+    (6, 'remover_indice_fase', _migracao_remover_indice_fase)
+]
+
+def desfazer_transacao(conn):
+    """
+    Desfaz a transação aberta na conexão. Se o DuckDB já a desfez (um
+    COMMIT que falhou por conflito, por exemplo), não faz nada, para não
+    encobrir o erro original.
+    """
+    try:
+        conn.execute("ROLLBACK")
+    except duckdb.TransactionException:
+        pass
+
+def aplicar_migracoes(conn, ate_versao=None):
+    """
+    Aplica, cada uma em sua transação, as migrações ainda não registradas
+    na tabela migracoes_schema. Retorna os nomes das migrações aplicadas.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS migracoes_schema (
+            versao INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            aplicada_em TIMESTAMP
+        )
+    """)
+    versao_atual = conn.execute(
+        "SELECT COALESCE(MAX(versao), 0) FROM migracoes_schema"
+    ).fetchone()[0]
+
+    aplicadas = []
+    for versao, nome, migracao in MIGRACOES:
+        if versao <= versao_atual:
+            continue
+        if ate_versao is not None and versao > ate_versao:
+            break
+
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            migracao(conn)
+            conn.execute("""
+                INSERT INTO migracoes_schema (versao, nome, aplicada_em)
+                VALUES (?, ?, current_timestamp)
+            """, (versao, nome))
+            conn.execute("COMMIT")
+        except Exception:
+            desfazer_transacao(conn)
+            raise
+        aplicadas.append(nome)
+
+    return aplicadas
+
+@functools.lru_cache(maxsize=None)
+def carregar_config(caminho_config='config.yaml'):
+    """Carrega o arquivo de configuração (lido uma única vez por processo)"""
+    with open(caminho_config, 'r') as f:
+        return yaml.safe_load(f)
+
+class GerenciadorConexao:
+    """
+    Mantém uma única conexão DuckDB por processo e entrega cursores
+    baratos para cada sessão. As migrações são aplicadas apenas na
+    criação do gerenciador.
+    """
+
+    def __init__(self, caminho_banco):
+        self.caminho_banco = caminho_banco
+        self.avisos = []
+        # Incrementada quando o arquivo do banco é substituído (restauração)
+        self.geracao = 0
+        self._cursores = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._estatisticas = {
+            'cursores_criados': 0,
+            'reutilizacoes': 0,
+            'tempo_obtencao_ms': 0.0,
+            'tempo_inicializacao_ms': 0.0
+        }
+
+        inicio = time.perf_counter()
+        self._conn = self._conectar()
+        for migracao in aplicar_migracoes(self._conn):
+            logging.info(f"Migração aplicada: {migracao}")
+        self._estatisticas['tempo_inicializacao_ms'] = (time.perf_counter() - inicio) * 1000
+
+    def _conectar(self):
+        """
+        Abre o banco. Um arquivo corrompido é renomeado para .corrompido (o
+        arquivo nunca é apagado) e um banco novo é criado. Os demais erros de
+        E/S, como o banco aberto por outro processo, são repassados.
+        """
+        if os.path.exists(self.caminho_banco):
+            try:
+                conn = duckdb.connect(self.caminho_banco)
+                conn.execute("SELECT 1")
+                return conn
+            except duckdb.IOException as e:
+                if 'not a valid DuckDB database file' not in str(e):
+                    raise
+            except Exception:
+                pass
+            destino = self._separar_corrompido()
+            self._avisar(f"Banco de dados corrompido, movido para {destino}. Criando novo banco...")
+        return duckdb.connect(self.caminho_banco)
+
+    def _separar_corrompido(self):
+        """Renomeia o arquivo do banco (e seu WAL) para .corrompido, sem sobrescrever outro"""
+        destino = self.caminho_banco + '.corrompido'
+        sufixo = 1
+        while os.path.exists(destino):
+            sufixo += 1
+            destino = f"{self.caminho_banco}.corrompido_{sufixo:03d}"
+        os.replace(self.caminho_banco, destino)
+        if os.path.exists(self.caminho_banco + '.wal'):
+            os.replace(self.caminho_banco + '.wal', destino + '.wal')
+        return destino
+
+    def _avisar(self, mensagem):
+        logging.warning(mensagem)
+        self.avisos.append(mensagem)
+
+    def cursor(self):
+        """Cria um novo cursor sobre a conexão compartilhada"""
+        inicio = time.perf_counter()
+        with self._lock:
+            cursor = self._conn.cursor()
+            self._cursores.add(cursor)
+            self._estatisticas['cursores_criados'] += 1
+            self._estatisticas['tempo_obtencao_ms'] += (time.perf_counter() - inicio) * 1000
+        return cursor
+
+    def registrar_reutilizacao(self):
+        """Contabiliza um cursor de sessão reaproveitado"""
+        with self._lock:
+            self._estatisticas['reutilizacoes'] += 1
+
+    def estatisticas(self):
+        """Retorna os contadores de uso da conexão"""
+        with self._lock:
+            estatisticas = dict(self._estatisticas)
+        total = estatisticas['cursores_criados'] + estatisticas['reutilizacoes']
+        estatisticas['taxa_reutilizacao'] = (
+            estatisticas['reutilizacoes'] * 100.0 / total if total else 0.0
+        )
+        estatisticas['tempo_medio_obtencao_ms'] = (
+            estatisticas['tempo_obtencao_ms'] / estatisticas['cursores_criados']
+            if estatisticas['cursores_criados'] else 0.0
+        )
+        return estatisticas
+
+    def substituir_banco(self, novo_caminho):
+        """
+        Substitui o arquivo do banco pelo informado (usado na restauração de
+        backups). Todos os cursores entregues são fechados e a geração é
+        incrementada para que as sessões obtenham cursores novos.
+        """
+        with self._lock:
+            for cursor in list(self._cursores):
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            self._conn.close()
+
+            os.replace(novo_caminho, self.caminho_banco)
+            # O WAL pertence ao banco substituído e não pode ser aplicado ao novo
+            if os.path.exists(self.caminho_banco + '.wal'):
+                os.remove(self.caminho_banco + '.wal')
+
+            self._conn = self._conectar()
+            for migracao in aplicar_migracoes(self._conn):
+                logging.info(f"Migração aplicada: {migracao}")
+            self.geracao += 1
+
+    def fechar(self):
+        with self._lock:
+            self._conn.close()
+
+_gerenciador = None
+_gerenciador_lock = threading.Lock()
+
+def obter_gerenciador(caminho_config='config.yaml'):
+    """Retorna o gerenciador de conexão do processo, criando-o na primeira chamada"""
+    global _gerenciador
+    if _gerenciador is None:
+        with _gerenciador_lock:
+            if _gerenciador is None:
+                config = carregar_config(caminho_config)
+                _gerenciador = GerenciadorConexao(config['database']['path'])
+    return _gerenciador
+
+class CacheConsultas:
+    """
+    Memoriza resultados das consultas registradas em consultas.py por nome
+    e parâmetros, com expiração por tempo (TTL) e descarte dos itens menos
+    usados (LRU). Cada escrita em pacientes/progresso deve chamar
+    invalidar(), que descarta todos os resultados anteriores.
+    """
+
+    def __init__(self, max_itens=256, ttl_segundos=300):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self.versao = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._estatisticas = {'acertos': 0, 'falhas': 0, 'invalidacoes': 0}
+
+    def executar(self, conn, nome, params=(), formato='df'):
+        """
+        Executa a consulta registrada ou devolve o resultado memorizado.
+        formato: 'df' (DataFrame), 'one' (fetchone) ou 'all' (fetchall)
+        """
+        chave = (nome, tuple(params), formato)
+        agora = time.monotonic()
+
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                versao, expira_em, resultado = item
+                if versao == self.versao and expira_em > agora:
+                    self._itens.move_to_end(chave)
+                    self._estatisticas['acertos'] += 1
+                    return resultado.copy() if formato == 'df' else resultado
+                del self._itens[chave]
+            self._estatisticas['falhas'] += 1
+            versao = self.versao
+
+        relacao = consultas.executar(conn, nome, params)
+        if formato == 'df':
+            resultado = relacao.fetchdf()
+        elif formato == 'one':
+            resultado = relacao.fetchone()
+        else:
+            resultado = relacao.fetchall()
+
+        with self._lock:
+            # Descarta o resultado se houve escrita durante a consulta
+            if versao == self.versao:
+                self._itens[chave] = (versao, agora + self.ttl_segundos, resultado)
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_itens:
+                    self._itens.popitem(last=False)
+
+        return resultado.copy() if formato == 'df' else resultado
+
+    def invalidar(self):
+        """Incrementa a versão dos dados e limpa o cache"""
+        with self._lock:
+            self.versao += 1
+            self._itens.clear()
+            self._estatisticas['invalidacoes'] += 1
+
+    def estatisticas(self):
+        """Retorna os contadores de acertos, falhas e invalidações"""
+        with self._lock:
+            estatisticas = dict(self._estatisticas)
+            estatisticas['itens'] = len(self._itens)
+            estatisticas['versao'] = self.versao
+        return estatisticas
+
+_cache = None
+
+def obter_cache(caminho_config='config.yaml'):
+    """Retorna o cache de consultas compartilhado pelo processo"""
+    global _cache
+    if _cache is None:
+        with _gerenciador_lock:
+            if _cache is None:
+                config_cache = carregar_config(caminho_config).get('cache', {})
+                _cache = CacheConsultas(
+                    max_itens=config_cache.get('max_itens', 256),
+                    ttl_segundos=config_cache.get('ttl_segundos', 300)
+                )
+    return _cache
@@ -0,0 +1,322 @@
+"""
+Benchmarks de desempenho do SAGRA.
+
+Uso: python benchmark.py [nome ...]
+Sem argumentos, executa todos os benchmarks. Deve ser executado a partir
+do diretório do projeto, pois usa o schema.sql.
+"""
+import os
+import sys
+import logging
+import tempfile
+import time
+import datetime
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import consultas
+from banco import aplicar_migracoes
+from analise_dados import exportar_dados, reduzir_pontos
+from datas import padronizar_data, padronizar_coluna_datas
+from padronizacao import (
+    COLUNAS_MONETARIAS, padronizar_valor_monetario, padronizar_coluna_monetaria, relatorio_validacao
+)
+
+def _medir(funcao, repeticoes):
+    """Retorna o tempo médio, em milissegundos, de uma chamada da função"""
+    inicio = time.perf_counter()
+    for i in range(repeticoes):
+        funcao(i)
+    return (time.perf_counter() - inicio) * 1000 / repeticoes
+
+def _popular_progresso(conn, n_registros, registros_por_paciente=10):
+    """Insere pacientes e registros de progresso sintéticos"""
+    n_pacientes = max(n_registros // registros_por_paciente, 1)
+    conn.execute(f"""
+        INSERT INTO pacientes (nome, data_cirurgia, data_cadastro)
+        SELECT 'Paciente ' || i, DATE '2023-01-01' + (i % 365)::INTEGER, DATE '2023-01-01'
+        FROM range({n_pacientes}) t(i)
+    """)
+    conn.execute(f"""
+        INSERT INTO progresso (paciente_id, fase, data_inicio, data_fim, status, observacoes)
+        SELECT 1 + (i % {n_pacientes}),
+               1 + (i % 5),
+               DATE '2023-01-01' + (i % 700)::INTEGER,
+               CASE WHEN i % 3 = 0 THEN NULL ELSE DATE '2023-01-01' + (i % 700 + 30)::INTEGER END,
+               CASE WHEN i % 3 = 0 THEN 'Em Andamento' ELSE 'Concluído' END,
+               ''
+        FROM range({n_registros}) t(i)
+    """)
+    return n_pacientes
+
+def _tabela_sem_chaves(conn, tabela, sequencia):
+    """
+    Troca a tabela por uma cópia sem chaves estrangeiras nem índices. Com o
+    DuckDB 0.10, a verificação das chaves estrangeiras torna a inserção de
+    1 milhão de registros impraticável.
+    """
+    conn.execute(f"CREATE TABLE {tabela}_sem_chaves AS SELECT * FROM {tabela} LIMIT 0")
+    conn.execute(f"DROP TABLE {tabela}")
+    conn.execute(f"ALTER TABLE {tabela}_sem_chaves RENAME TO {tabela}")
+    conn.execute(f"ALTER TABLE {tabela} ALTER COLUMN id SET DEFAULT nextval('{sequencia}')")
+
+def benchmark_indices(tamanhos=(10_000, 100_000, 1_000_000), repeticoes=200):
+    """
+    Latência da busca de progresso por paciente e da inserção de um registro
+    sem índices, com os dois índices da migração 3 e só com o de paciente_id,
+    que é o que resta depois da migração 6.
+    """
+    configuracoes = {
+        'sem índices': [],
+        'migração 3': ['idx_progresso_paciente ON progresso(paciente_id)', 'idx_progresso_fase ON progresso(fase)'],
+        'migração 6': ['idx_progresso_paciente ON progresso(paciente_id)']
+    }
+    print("Progresso por paciente (média por operação)")
+    for n_registros in tamanhos:
+        for nome, indices in configuracoes.items():
+            conn = duckdb.connect()
+            aplicar_migracoes(conn, ate_versao=2)
+            _tabela_sem_chaves(conn, 'progresso', 'seq_progresso')
+            n_pacientes = _popular_progresso(conn, n_registros)
+            for indice in indices:
+                conn.execute(f"CREATE INDEX {indice}")
+
+            def paciente(i):
+                return 1 + (i * 7919) % n_pacientes
+
+            busca = _medir(
+                lambda i: consultas.executar(conn, 'progresso_paciente', (paciente(i),)).fetchall(), repeticoes
+            )
+            insercao = _medir(
+                lambda i: consultas.executar(
+                    conn, 'inserir_progresso', (paciente(i), 1 + i % 5, '2024-01-01', 'Em Andamento', '')
+                ), repeticoes
+            )
+            conn.close()
+
+            print(f"  {n_registros:>9} registros | {nome:<11} | busca: {busca:7.3f} ms"
+                  f" | inserção: {insercao:7.3f} ms")
+
+def benchmark_medicoes(tamanhos=(10_000, 100_000, 1_000_000), repeticoes=200, medicoes_por_paciente=400):
+    """Latência das consultas de medições de um paciente com e sem o índice da migração 5"""
+    inicio, fim = datetime.date(2023, 1, 10), datetime.date(2023, 3, 1)
+    print("Medições de um paciente (média por consulta)")
+    for n_registros in tamanhos:
+        for indice in (False, True):
+            conn = duckdb.connect()
+            aplicar_migracoes(conn)
+            _tabela_sem_chaves(conn, 'medicoes', 'seq_medicoes')
+            n_pacientes = max(n_registros // medicoes_por_paciente, 1)
+            conn.execute(f"""
+                INSERT INTO pacientes (nome, data_cadastro)
+                SELECT 'Paciente ' || i, DATE '2023-01-01'
+                FROM range({n_pacientes}) t(i)
+            """)
+            conn.execute(f"""
+                INSERT INTO medicoes (paciente_id, tipo, data, valor)
+                SELECT 1 + (i % {n_pacientes}),
+                       list_extract(list_value('forca', 'amplitude', 'dor', 'edema'), 1 + (i // {n_pacientes}) % 4),
+                       TIMESTAMP '2023-01-01' + to_days((i // {n_pacientes} // 4)::INTEGER),
+                       random() * 10
+                FROM range({n_registros}) t(i)
+            """)
+            if indice:
+                conn.execute("CREATE INDEX idx_medicoes_paciente ON medicoes(paciente_id)")
+
+            def paciente(i):
+                return 1 + (i * 7919) % n_pacientes
+
+            periodo = _medir(
+                lambda i: consultas.executar(conn, 'medicoes_periodo', (paciente(i), 'dor', inicio, fim)).fetchall(),
+                repeticoes
+            )
+            contagem = _medir(
+                lambda i: consultas.executar(conn, 'contagem_medicoes', (paciente(i),)).fetchall(), repeticoes
+            )
+            conn.close()
+
+            print(f"  {n_registros:>9} registros | {'com' if indice else 'sem'} índice"
+                  f" | período: {periodo:7.3f} ms | contagem: {contagem:7.3f} ms")
+
+def benchmark_consultas(n_registros=100_000, repeticoes=500):
+    """
+    Custo de vincular os parâmetros de uma consulta do registro, comparado a
+    interpolar o valor no SQL e a EXECUTE de uma consulta preparada com o
+    valor literal (o DuckDB não aceita parâmetros vinculados no EXECUTE).
+    """
+    conn = duckdb.connect()
+    aplicar_migracoes(conn)
+    n_pacientes = _popular_progresso(conn, n_registros)
+    sql = consultas.CONSULTAS['progresso_paciente']
+    conn.execute(f"PREPARE progresso_paciente AS {sql}")
+
+    def paciente(i):
+        return 1 + (i * 7919) % n_pacientes
+
+    tempos = {
+        'SQL interpolado (f-string)': _medir(
+            lambda i: conn.execute(sql.replace('$1', str(paciente(i)))).fetchall(), repeticoes
+        ),
+        'PREPARE + EXECUTE literal': _medir(
+            lambda i: conn.execute(f"EXECUTE progresso_paciente({paciente(i)})").fetchall(), repeticoes
+        ),
+        'registro (parâmetro vinculado)': _medir(
+            lambda i: consultas.executar(conn, 'progresso_paciente', (paciente(i),)).fetchall(), repeticoes
+        )
+    }
+    conn.close()
+
+    print(f"Progresso de um paciente com {n_registros} registros (média por consulta)")
+    referencia = tempos['SQL interpolado (f-string)']
+    for nome, tempo in tempos.items():
+        print(f"  {nome:<30} {tempo:7.3f} ms ({(tempo - referencia) * 100 / referencia:+6.1f}% em relação ao SQL interpolado)")
+
+def _tamanho(caminho):
+    """Tamanho em bytes de um arquivo ou de todos os arquivos de um diretório"""
+    if os.path.isdir(caminho):
+        return sum(
+            os.path.getsize(os.path.join(raiz, arquivo))
+            for raiz, _, arquivos in os.walk(caminho) for arquivo in arquivos
+        )
+    return os.path.getsize(caminho)
+
+def benchmark_exportacao(n_registros=100_000):
+    """Tempo de escrita e tamanho dos arquivos de cada formato de exportação"""
+    conn = duckdb.connect()
+    aplicar_migracoes(conn)
+    _popular_progresso(conn, n_registros)
+
+    print(f"Exportação de {n_registros} registros de progresso")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for formato, particionar_por in [('excel', None), ('csv', None), ('parquet', None),
+                                          ('parquet', 'fase'), ('parquet', 'ano'), ('feather', None)]:
+            nome = formato + (f" por {particionar_por}" if particionar_por else "")
+            inicio = time.perf_counter()
+            caminhos = exportar_dados(
+                conn, formato, particionar_por=particionar_por,
+                diretorio=os.path.join(diretorio, nome.replace(' ', '_'))
+            )
+            tempo = time.perf_counter() - inicio
+            tamanho = sum(_tamanho(caminho) for caminho in caminhos)
+            print(f"  {nome:<18} {tempo:8.3f} s {tamanho / 1024:10.1f} KB")
+    conn.close()
+
+def _payload_arrow(dados):
+    """Serializa os dados como o Streamlit envia ao navegador (Arrow IPC) e retorna os bytes"""
+    tabela = pa.Table.from_pandas(dados.reset_index())
+    saida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(saida, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return saida.getvalue()
+
+def benchmark_graficos(tamanhos=(10_000, 100_000, 1_000_000), repeticoes=5):
+    """Tamanho e tempo de preparo dos dados de um gráfico, com e sem redução de pontos"""
+    print("Dados de um gráfico de medições (redução + serialização Arrow)")
+    gerador = np.random.default_rng(0)
+    for n_pontos in tamanhos:
+        dados = pd.DataFrame(
+            {'Valor': np.cumsum(gerador.normal(size=n_pontos))},
+            index=pd.date_range('2024-01-01', periods=n_pontos, freq='min', name='Data')
+        )
+        for nome, preparar in [('completo', lambda: dados), ('reduzido', lambda: reduzir_pontos(dados))]:
+            tempo = _medir(lambda i: _payload_arrow(preparar()), repeticoes)
+            tamanho = _payload_arrow(preparar()).size
+            print(f"  {n_pontos:>9} pontos | {nome:<8} {tempo:9.3f} ms {tamanho / 1024:10.1f} KB")
+
+def _coluna_datas(n_linhas, gerador):
+    """Coluna de datas em texto: 95% dd/mm/aaaa, 4% ISO, 0,5% vazias e 0,1% inválidas"""
+    datas = pd.Timestamp('2020-01-01') + pd.to_timedelta(gerador.integers(0, 2000, n_linhas), unit='D')
+    coluna = pd.Series(datas.strftime('%d/%m/%Y'), dtype=object)
+    sorteio = gerador.random(n_linhas)
+    coluna[sorteio < 0.04] = datas[sorteio < 0.04].strftime('%Y-%m-%d')
+    coluna[(sorteio >= 0.04) & (sorteio < 0.045)] = None
+    coluna[(sorteio >= 0.045) & (sorteio < 0.046)] = 'sem data'
+    return coluna
+
+def benchmark_datas(tamanhos=(10_000, 100_000, 1_000_000)):
+    """Padronização de uma coluna de datas linha a linha (apply) e por coluna"""
+    print("Padronização de uma coluna de datas")
+    gerador = np.random.default_rng(0)
+    logging.disable(logging.WARNING)
+    try:
+        for n_linhas in tamanhos:
+            coluna = _coluna_datas(n_linhas, gerador)
+            inicio = time.perf_counter()
+            por_linha = coluna.apply(padronizar_data)
+            tempo_linha = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            por_coluna = padronizar_coluna_datas(coluna)
+            tempo_coluna = time.perf_counter() - inicio
+            iguais = por_linha.fillna('').equals(por_coluna.fillna(''))
+            print(f"  {n_linhas:>9} linhas | apply: {tempo_linha:7.3f} s | por coluna: {tempo_coluna:7.3f} s"
+                  f" | {tempo_linha / tempo_coluna:5.1f}x | resultados iguais: {'sim' if iguais else 'NÃO'}")
+    finally:
+        logging.disable(logging.NOTSET)
+
+def _coluna_monetaria(n_linhas, gerador):
+    """Coluna de valores em texto ('R$ 1.234,56', '1234,56'), números, vazios e inválidos"""
+    centavos = gerador.integers(0, 10_000_000, n_linhas)
+    reais = pd.Series(centavos // 100).map('{:,}'.format).str.replace(',', '.', regex=False)
+    coluna = ('R$ ' + reais + ',' + pd.Series(centavos % 100).map('{:02d}'.format)).astype(object)
+    sorteio = gerador.random(n_linhas)
+    coluna[sorteio < 0.3] = coluna[sorteio < 0.3].str.replace('R$ ', '', regex=False)
+    coluna[(sorteio >= 0.3) & (sorteio < 0.4)] = centavos[(sorteio >= 0.3) & (sorteio < 0.4)] // 100
+    coluna[(sorteio >= 0.4) & (sorteio < 0.42)] = None
+    coluna[(sorteio >= 0.42) & (sorteio < 0.43)] = 'a combinar'
+    return coluna
+
+def benchmark_monetarios(n_linhas=200_000):
+    """Vazão da padronização das sete colunas monetárias, valor a valor (apply) e por coluna"""
+    gerador = np.random.default_rng(0)
+    df = pd.DataFrame({coluna: _coluna_monetaria(n_linhas, gerador) for coluna in COLUNAS_MONETARIAS})
+    total = n_linhas * len(COLUNAS_MONETARIAS)
+
+    inicio = time.perf_counter()
+    por_valor = {coluna: df[coluna].apply(padronizar_valor_monetario) for coluna in COLUNAS_MONETARIAS}
+    tempo_valor = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    por_coluna = {coluna: padronizar_coluna_monetaria(df[coluna]) for coluna in COLUNAS_MONETARIAS}
+    tempo_coluna = time.perf_counter() - inicio
+    iguais = all(por_valor[coluna].equals(por_coluna[coluna]) for coluna in COLUNAS_MONETARIAS)
+
+    print(f"Padronização de {len(COLUNAS_MONETARIAS)} colunas monetárias com {n_linhas} linhas")
+    print(f"  apply:      {tempo_valor:7.3f} s {total / tempo_valor / 1e6:6.2f} M valores/s")
+    print(f"  por coluna: {tempo_coluna:7.3f} s {total / tempo_coluna / 1e6:6.2f} M valores/s"
+          f" | resultados iguais: {'sim' if iguais else 'NÃO'}")
+
+def benchmark_validacao(n_linhas=1_000_000, n_erros=1000):
+    """Tempo do relatório de validação de um DataFrame já padronizado, com alguns valores inválidos"""
+    gerador = np.random.default_rng(0)
+    datas = pd.Series(
+        (pd.Timestamp('2020-01-01') + pd.to_timedelta(gerador.integers(0, 2000, n_linhas), unit='D'))
+        .strftime('%Y-%m-%d'), dtype=object
+    )
+    df = pd.DataFrame({'data_entrada': datas, 'data_saida': datas.copy(), 'recebido': 'SIM'})
+    for coluna in COLUNAS_MONETARIAS:
+        df[coluna] = pd.Series(gerador.random(n_linhas) * 1000, dtype=object)
+    linhas = gerador.choice(n_linhas, n_erros, replace=False)
+    df.loc[linhas[: n_erros // 2], 'data_entrada'] = '01/02/2024'
+    df.loc[linhas[n_erros // 2:], 'lucro'] = 'R$ 10,00'
+
+    inicio = time.perf_counter()
+    relatorio = relatorio_validacao(df)
+    tempo = time.perf_counter() - inicio
+    print(f"Validação de {n_linhas} linhas ({len(COLUNAS_MONETARIAS) + 3} colunas): {tempo:.3f} s,"
+          f" {len(relatorio['erros'])} valores inválidos encontrados de {n_erros}")
+
+BENCHMARKS = {
+    'indices': benchmark_indices,
+    'medicoes': benchmark_medicoes,
+    'consultas': benchmark_consultas,
+    'exportacao': benchmark_exportacao,
+    'graficos': benchmark_graficos,
+    'datas': benchmark_datas,
+    'monetarios': benchmark_monetarios,
+    'validacao': benchmark_validacao
+}
+
+if __name__ == "__main__":
+    nomes = sys.argv[1:] or list(BENCHMARKS)
+    for nome in nomes:
+        BENCHMARKS[nome]()
@@ -0,0 +1,176 @@
+"""
+Registro das consultas nomeadas do sistema.
+
+As consultas usam parâmetros posicionais ($1, $2, ...), sempre vinculados
+pelo DuckDB na execução: nenhum valor é interpolado no SQL.
+"""
+import threading
+
+CONSULTAS = {
+    # Pacientes
+    'pacientes': """
+        SELECT * FROM pacientes
+    """,
+    'lista_pacientes': """
+        SELECT id, nome FROM pacientes
+    """,
+    'paciente': """
+        SELECT nome, data_cirurgia, data_cadastro
+        FROM pacientes
+        WHERE id = $1
+    """,
+    'inserir_paciente': """
+        INSERT INTO pacientes (nome, data_cirurgia, data_cadastro)
+        VALUES ($1, $2, $3)
+    """,
+
+    # Progresso
+    'progresso_paciente': """
+        SELECT p.*, f.fase as nome_fase
+        FROM progresso p
+        JOIN fases_reabilitacao f ON p.fase = f.id
+        WHERE p.paciente_id = $1
+        ORDER BY p.data_inicio
+    """,
+    'progresso_completo': """
+        SELECT p.*, f.fase as nome_fase
+        FROM progresso p
+        JOIN fases_reabilitacao f ON p.fase = f.id
+    """,
+    'contagem_exportacao': """
+        SELECT (SELECT COUNT(*) FROM pacientes),
+               (SELECT COUNT(*) FROM progresso p JOIN fases_reabilitacao f ON p.fase = f.id)
+    """,
+    'inserir_progresso': """
+        INSERT INTO progresso (paciente_id, fase, data_inicio, status, observacoes)
+        VALUES ($1, $2, $3, $4, $5)
+    """,
+
+    # Dashboard: todos os indicadores em uma única varredura de progresso
+    'indicadores_dashboard': """
+        WITH agregados AS (
+            SELECT p.fase,
+                   GROUPING(p.fase) AS geral,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE p.data_fim IS NULL) AS ativos,
+                   COUNT(*) FILTER (WHERE p.data_fim IS NOT NULL) AS concluidos
+            FROM progresso p
+            GROUP BY GROUPING SETS ((), (p.fase))
+        )
+        SELECT a.geral, a.fase AS fase_id, f.fase, a.total, a.ativos, a.concluidos,
+               (SELECT COUNT(*) FROM pacientes) AS total_pacientes
+        FROM agregados a
+        LEFT JOIN fases_reabilitacao f ON a.fase = f.id
+        ORDER BY a.geral DESC, a.fase
+    """,
+    'pacientes_recentes': """
+        SELECT p.nome, p.data_cirurgia, f.fase, pr.status
+        FROM pacientes p
+        JOIN progresso pr ON p.id = pr.paciente_id
+        JOIN fases_reabilitacao f ON pr.fase = f.id
+        ORDER BY pr.data_inicio DESC
+        LIMIT 5
+    """,
+
+    # Protocolos (importados das planilhas por protocolos.py)
+    'protocolos': """
+        SELECT id, arquivo, titulo, hash, importado_em
+        FROM protocolos
+        ORDER BY arquivo
+    """,
+    'fases_protocolo': """
+        SELECT ordem, fase, descricao, microciclo_inicio, microciclo_fim
+        FROM protocolo_fases
+        WHERE protocolo_id = $1
+        ORDER BY ordem
+    """,
+    'exercicios_protocolo': """
+        SELECT area, exercicio, fase, microciclo, prescricao
+        FROM protocolo_exercicios
+        WHERE protocolo_id = $1
+        ORDER BY linha, microciclo
+    """,
+    'criterios_protocolo': """
+        SELECT criterio, microciclo, descricao
+        FROM protocolo_criterios
+        WHERE protocolo_id = $1
+        ORDER BY linha, microciclo
+    """,
+
+    # Medições dos atletas
+    'medicoes_periodo': """
+        SELECT data, valor
+        FROM medicoes
+        WHERE paciente_id = $1
+          AND tipo = $2
+          AND data >= $3
+          AND data < $4 + INTERVAL 1 DAY
+        ORDER BY data
+    """,
+    'medicoes_periodo_todos': """
+        SELECT data, tipo, valor
+        FROM medicoes
+        WHERE paciente_id = $1
+          AND data >= $2
+          AND data < $3 + INTERVAL 1 DAY
+        ORDER BY tipo, data
+    """,
+    'contagem_medicoes': """
+        SELECT COUNT(*) FROM medicoes WHERE paciente_id = $1
+    """,
+    # Regressão linear (mínimos quadrados) do valor pelos dias, por paciente
+    # e tipo, em uma única passagem; os intervalos são calculados em Python
+    'tendencias_medicoes': """
+        SELECT t.paciente_id, p.nome, t.tipo, t.n, t.inclinacao,
+               t.r2, t.sxx, t.syy, t.sxy, t.primeira_data, t.ultima_data
+        FROM (
+            SELECT paciente_id, tipo,
+                   regr_count(valor, dias) as n,
+                   regr_slope(valor, dias) as inclinacao,
+                   regr_r2(valor, dias) as r2,
+                   regr_sxx(valor, dias) as sxx,
+                   regr_syy(valor, dias) as syy,
+                   regr_sxy(valor, dias) as sxy,
+                   MIN(data) as primeira_data,
+                   MAX(data) as ultima_data
+            FROM (SELECT paciente_id, tipo, data, valor, epoch(data) / 86400.0 as dias FROM medicoes)
+            GROUP BY paciente_id, tipo
+        ) t
+        JOIN pacientes p ON p.id = t.paciente_id
+        ORDER BY t.paciente_id, t.tipo
+    """,
+
+    # Análise estatística
+    'tempo_medio_fase': """
+        SELECT f.fase,
+               AVG(DATEDIFF('day', p.data_inicio, p.data_fim)) as tempo_medio
+        FROM progresso p
+        JOIN fases_reabilitacao f ON p.fase = f.id
+        WHERE p.data_fim IS NOT NULL
+        GROUP BY f.fase
+    """,
+    'taxa_sucesso_fase': """
+        SELECT f.fase,
+               COUNT(CASE WHEN p.status = 'Concluído' THEN 1 END) * 100.0 / COUNT(*) as taxa_sucesso
+        FROM progresso p
+        JOIN fases_reabilitacao f ON p.fase = f.id
+        GROUP BY f.fase
+    """
+}
+
+_lock = threading.Lock()
+_estatisticas = {'execucoes': 0}
+
+def executar(conn, nome, params=()):
+    """
+    Executa a consulta registrada com os parâmetros informados, vinculados
+    pelo DuckDB. Retorna a conexão, para uso com fetchone/fetchall/fetchdf.
+    """
+    with _lock:
+        _estatisticas['execucoes'] += 1
+    return conn.execute(CONSULTAS[nome], list(params))
+
+def estatisticas():
+    """Retorna quantas consultas foram executadas"""
+    with _lock:
+        return dict(_estatisticas)
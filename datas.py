@@ -0,0 +1,136 @@
+"""
+Padronização de datas para o formato YYYY-MM-DD.
+
+padronizar_data converte um valor por vez. padronizar_coluna_datas converte
+uma coluna inteira: detecta o formato predominante em uma amostra, converte
+a coluna de uma vez com pd.to_datetime(format=...) e tenta os demais
+formatos apenas nas linhas que sobraram. O que ainda não foi convertido
+passa por padronizar_data, linha a linha, o que garante o mesmo resultado.
+
+Para tabelas do DuckDB, expressao_sql_data gera a mesma conversão em SQL,
+sem trazer os dados para o Python.
+"""
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Formatos aceitos, na ordem em que são tentados
+FORMATOS_DATA = [
+    '%d/%m/%Y',
+    '%Y-%m-%d',
+    '%d-%m-%Y',
+    '%d/%m/%y',
+    '%Y/%m/%d'
+]
+
+# Forma que o texto deve ter em cada formato, com o número de dígitos que o
+# strptime do Python exige; o try_strptime do DuckDB aceita anos com
+# qualquer número de dígitos e leria '01/02/24' como o ano 24 em '%d/%m/%Y'.
+# Como no Python, o dia pode ter um espaço no lugar do zero (' 3')
+PADROES_FORMATOS = {
+    '%d/%m/%Y': r'(\d{1,2}| [1-9])/\d{1,2}/\d{4}',
+    '%Y-%m-%d': r'\d{4}-\d{1,2}-(\d{1,2}| [1-9])',
+    '%d-%m-%Y': r'(\d{1,2}| [1-9])-\d{1,2}-\d{4}',
+    '%d/%m/%y': r'(\d{1,2}| [1-9])/\d{1,2}/\d{2}',
+    '%Y/%m/%d': r'\d{4}/\d{1,2}/(\d{1,2}| [1-9])'
+}
+
+# Classe de caracteres (RE2) com os mesmos espaços que o str.strip() do
+# Python retira das pontas: os separadores Unicode (\pZ, que inclui o
+# espaço sem quebra U+00A0) e os caracteres de controle tidos como espaço
+ESPACOS_SQL = r'[\pZ\t\n\v\f\r\x{1c}-\x{1f}\x{85}]'
+
+def padronizar_data(data_str):
+    """
+    Converte uma string de data para o formato YYYY-MM-DD.
+    Aceita múltiplos formatos de entrada.
+    """
+    try:
+        if pd.isna(data_str):
+            return None
+
+        # Tentar cada formato até encontrar um que funcione
+        for formato in FORMATOS_DATA:
+            try:
+                return datetime.strptime(str(data_str).strip(), formato).strftime('%Y-%m-%d')
+            except:
+                continue
+
+        logging.warning(f"Formato de data não reconhecido: {data_str}")
+        return None
+    except Exception as e:
+        logging.error(f"Erro ao converter data {data_str}: {e}")
+        return None
+
+def _formato_valor(texto):
+    """Primeiro formato de FORMATOS_DATA que converte o texto, ou None"""
+    for formato in FORMATOS_DATA:
+        try:
+            datetime.strptime(texto, formato)
+            return formato
+        except ValueError:
+            continue
+    return None
+
+def detectar_formatos(textos, tamanho_amostra=1000):
+    """
+    Ordena os formatos pela frequência com que aparecem em uma amostra dos
+    textos (já sem espaços nas pontas). Os formatos ausentes da amostra
+    ficam no fim, na ordem de FORMATOS_DATA.
+    """
+    if len(textos) > tamanho_amostra:
+        textos = textos.sample(tamanho_amostra, random_state=0)
+    contagem = pd.Series([_formato_valor(texto) for texto in textos], dtype=object).value_counts()
+    return list(contagem.index) + [formato for formato in FORMATOS_DATA if formato not in contagem.index]
+
+def padronizar_coluna_datas(serie, tamanho_amostra=1000):
+    """
+    Converte uma coluna inteira de datas para strings YYYY-MM-DD (None para
+    vazios e não reconhecidos), com o mesmo resultado de aplicar
+    padronizar_data a cada valor. Cada texto distinto é convertido uma
+    única vez.
+    """
+    resultado = np.full(len(serie), None, dtype=object)
+    posicoes = np.flatnonzero(serie.notna().to_numpy())
+    if not len(posicoes):
+        return pd.Series(resultado, index=serie.index, dtype=object, name=serie.name)
+
+    textos = serie.iloc[posicoes].map(str).str.strip()
+    codigos, unicos = pd.factorize(textos)
+    convertidos = np.full(len(unicos), None, dtype=object)
+    pendentes = np.arange(len(unicos))
+
+    for formato in detectar_formatos(textos, tamanho_amostra):
+        if not len(pendentes):
+            break
+        datas = pd.to_datetime(pd.Series(unicos[pendentes], dtype=object), format=formato, errors='coerce')
+        ok = datas.notna().to_numpy()
+        convertidos[pendentes[ok]] = datas[ok].to_numpy().astype('datetime64[D]').astype(str)
+        pendentes = pendentes[~ok]
+
+    # Textos que o pandas não converteu (fora do intervalo de datas dele ou
+    # não reconhecidos) seguem pela conversão valor a valor
+    for indice in pendentes:
+        convertidos[indice] = padronizar_data(unicos[indice])
+
+    resultado[posicoes] = convertidos[codigos]
+    return pd.Series(resultado, index=serie.index, dtype=object, name=serie.name)
+
+def texto_sql_data(coluna):
+    """Expressão SQL (DuckDB) com o texto da coluna sem espaços nas pontas"""
+    return f"regexp_replace(CAST({coluna} AS VARCHAR), '^{ESPACOS_SQL}+|{ESPACOS_SQL}+$', '', 'g')"
+
+def expressao_sql_data(texto):
+    """
+    Expressão SQL (DuckDB) que converte o texto de uma data (já sem espaços
+    nas pontas, ver texto_sql_data) para DATE, tentando os formatos de
+    FORMATOS_DATA na ordem (COALESCE de try_strptime). Textos não
+    reconhecidos viram NULL.
+    """
+    tentativas = ",\n".join(
+        f"CASE WHEN regexp_full_match({texto}, '{PADROES_FORMATOS[formato]}') "
+        f"THEN try_strptime(replace({texto}, ' ', ''), '{formato}') END"
+        for formato in FORMATOS_DATA
+    )
+    return f"CAST(COALESCE(\n{tentativas}\n) AS DATE)"
@@ -0,0 +1,89 @@
+"""
+Importação em lote das planilhas para o banco.
+
+A leitura de .xlsx pelo openpyxl ocupa um núcleo por arquivo. As planilhas
+são lidas em paralelo, em processos separados (ProcessPoolExecutor), e o
+resultado de cada uma volta como tabelas Arrow, gravadas no DuckDB pelo
+processo principal, que é o único escritor do banco.
+
+O número de processos vem de config.yaml (importacao.trabalhadores,
+0 usa todos os núcleos) ou da opção --trabalhadores.
+
+Uso: python importacao.py [--trabalhadores N] [--forcar] [--medicoes-paciente ID]
+
+Com --medicoes-paciente, as planilhas de dados_atletas também são
+importadas como medições do paciente informado.
+"""
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from banco import carregar_config
+
+def numero_trabalhadores(trabalhadores=None):
+    """Número de processos de leitura (o configurado, ou todos os núcleos se 0)"""
+    if trabalhadores is None:
+        trabalhadores = carregar_config().get('importacao', {}).get('trabalhadores', 0)
+    return trabalhadores or os.cpu_count() or 1
+
+def _ler_com_tempo(funcao, caminho):
+    """Executa a leitura de um arquivo, retornando o resultado, o tempo e o erro"""
+    inicio = time.perf_counter()
+    try:
+        return funcao(caminho), time.perf_counter() - inicio, None
+    except Exception as e:
+        return None, time.perf_counter() - inicio, str(e)
+
+def ler_em_paralelo(funcao, caminhos, trabalhadores=None):
+    """
+    Aplica a função de leitura (de nível de módulo, para poder ser enviada
+    aos processos) a cada arquivo. Gera (caminho, resultado, segundos, erro)
+    na ordem em que as leituras terminam.
+    """
+    trabalhadores = min(numero_trabalhadores(trabalhadores), len(caminhos))
+    if trabalhadores <= 1:
+        for caminho in caminhos:
+            yield (caminho,) + _ler_com_tempo(funcao, caminho)
+        return
+
+    # spawn: o processo do Streamlit tem threads (DuckDB, agendador de
+    # backup) que não podem ser copiadas com fork
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=trabalhadores, mp_context=contexto) as executor:
+        futuros = {executor.submit(_ler_com_tempo, funcao, caminho): caminho for caminho in caminhos}
+        for futuro in as_completed(futuros):
+            yield (futuros[futuro],) + futuro.result()
+
+if __name__ == "__main__":
+    from banco import obter_gerenciador
+    from protocolos import importar_protocolos
+    from medicoes import importar_medicoes
+
+    argumentos = sys.argv[1:]
+    trabalhadores = None
+    if '--trabalhadores' in argumentos:
+        trabalhadores = int(argumentos[argumentos.index('--trabalhadores') + 1])
+
+    conn = obter_gerenciador().cursor()
+    inicio = time.perf_counter()
+    resumo = importar_protocolos(conn, forcar='--forcar' in argumentos, trabalhadores=trabalhadores)
+    duracao = time.perf_counter() - inicio
+
+    print(f"Protocolos ({numero_trabalhadores(trabalhadores)} processo(s)): "
+          f"{len(resumo['importados'])} importados, {resumo['inalterados']} inalterados, "
+          f"{len(resumo['removidos'])} removidos, {len(resumo['erros'])} com erro "
+          f"em {duracao:.2f} s")
+    for arquivo, segundos in sorted(resumo['tempos'].items(), key=lambda item: -item[1]):
+        print(f"  {segundos:7.3f} s  {arquivo}")
+    for arquivo, erro in resumo['erros'].items():
+        print(f"  {arquivo}: {erro}")
+
+    if '--medicoes-paciente' in argumentos:
+        paciente_id = int(argumentos[argumentos.index('--medicoes-paciente') + 1])
+        resumo = importar_medicoes(conn, paciente_id, trabalhadores=trabalhadores)
+        print(f"Medições do paciente {paciente_id}: {sum(resumo['inseridas'].values())} inseridas")
+        for tipo, inseridas in resumo['inseridas'].items():
+            print(f"  {inseridas:7d}  {tipo}")
+        for arquivo, erro in resumo['erros'].items():
+            print(f"  {arquivo}: {erro}")
@@ -0,0 +1,268 @@
+"""
+Importação em lotes de planilhas de despesas e receitas (CSV ou Excel)
+para o DuckDB.
+
+O arquivo é lido em lotes de tamanho fixo (pd.read_csv com chunksize, ou o
+openpyxl em modo somente leitura), então a memória usada não depende do
+tamanho do arquivo. Cada lote é padronizado (padronizar_dataframe),
+validado e gravado na tabela por meio de uma tabela Arrow. São rejeitadas,
+e relatadas, as linhas com valores que a padronização não reconhece
+(erros_padronizacao) ou que não passam em relatorio_validacao. Células
+numéricas do Excel nas colunas monetárias já são números e não passam pela
+limpeza de texto.
+
+O avanço fica na tabela importacoes do mesmo banco, atualizada na mesma
+transação de cada lote: se a importação for interrompida, basta executá-la
+de novo para que continue do último lote gravado.
+
+Uso: python importar_despesas.py ARQUIVO [--banco airbnb.duckdb]
+     [--tabela despesas_receitas] [--tamanho-lote N] [--reiniciar]
+
+Com --reiniciar, a importação recomeça do início mesmo que o arquivo tenha
+mudado desde a tentativa anterior (as linhas já gravadas não são removidas).
+"""
+import os
+import sys
+import time
+import logging
+from datetime import datetime, date
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from openpyxl import load_workbook
+from banco import desfazer_transacao
+from padronizacao import (
+    padronizar_dataframe, relatorio_validacao, erros_padronizacao, COLUNAS_DATA, COLUNAS_MONETARIAS
+)
+
+TAMANHO_LOTE = 50000
+
+# Máximo de valores inválidos guardados no resumo (todos são contados)
+LIMITE_ERROS_RELATADOS = 1000
+
+def _texto_celula(valor):
+    """Texto de uma célula do Excel, como ela apareceria em um CSV"""
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        if valor.time() == datetime.min.time():
+            return valor.date().isoformat()
+        return valor.isoformat(sep=' ')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+def _numero(valor):
+    """Indica se o valor de uma célula é um número (int ou float, mas não bool)"""
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+def ler_lotes(caminho, tamanho_lote=TAMANHO_LOTE, pular=0):
+    """
+    Gera DataFrames com até tamanho_lote linhas do arquivo, começando
+    depois das primeiras pular linhas de dados. Os valores são textos,
+    exceto as células numéricas do Excel nas colunas monetárias.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.csv':
+        yield from pd.read_csv(caminho, dtype=str, chunksize=tamanho_lote,
+                               skiprows=lambda linha: 0 < linha <= pular)
+    elif extensao in ('.xlsx', '.xlsm'):
+        workbook = load_workbook(caminho, read_only=True, data_only=True)
+        try:
+            aba = workbook.active
+            cabecalho = [str(nome) for nome in next(aba.iter_rows(max_row=1, values_only=True))]
+            monetarias = [nome in COLUNAS_MONETARIAS for nome in cabecalho]
+            linhas = []
+            for linha in aba.iter_rows(min_row=pular + 2, values_only=True):
+                linhas.append([
+                    valor if monetaria and _numero(valor) else _texto_celula(valor)
+                    for valor, monetaria in zip(linha, monetarias)
+                ])
+                if len(linhas) == tamanho_lote:
+                    yield pd.DataFrame(linhas, columns=cabecalho, dtype=object)
+                    linhas = []
+            if linhas:
+                yield pd.DataFrame(linhas, columns=cabecalho, dtype=object)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Formato de arquivo não suportado: {extensao}")
+
+def _padronizar_lote(lote):
+    """
+    Padroniza o lote e retorna-o com os valores inválidos encontrados,
+    no formato de relatorio_validacao()['erros']. Os números das colunas
+    monetárias são mantidos como estão; só os textos são padronizados.
+    """
+    numeros = {}
+    for coluna in COLUNAS_MONETARIAS:
+        if coluna in lote.columns:
+            tipos = pd.Series(np.frompyfunc(type, 1, 1)(lote[coluna].to_numpy(dtype=object)), dtype=object)
+            # O read_csv devolve as células vazias como NaN (float), que não são números
+            numeros[coluna] = tipos.isin([int, float]).to_numpy() & lote[coluna].notna().to_numpy()
+
+    original = lote
+    lote = lote.copy()
+    for coluna, mascara in numeros.items():
+        lote.loc[mascara, coluna] = None
+    lote = padronizar_dataframe(lote)
+    for coluna, mascara in numeros.items():
+        lote.loc[mascara, coluna] = original.loc[mascara, coluna].astype(float)
+
+    relatorio = relatorio_validacao(lote)
+    if relatorio['colunas_ausentes']:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(relatorio['colunas_ausentes'])}")
+    erros = [linhas for linhas in (erros_padronizacao(original, lote), relatorio['erros']) if not linhas.empty]
+    if erros:
+        erros = pd.concat(erros, ignore_index=True)
+    else:
+        erros = pd.DataFrame(columns=['linha', 'coluna', 'valor', 'motivo'])
+    return lote, erros
+
+def _esquema(colunas):
+    """Esquema Arrow da tabela: datas como DATE, valores monetários como DOUBLE e o resto texto"""
+    campos = []
+    for coluna in colunas:
+        if coluna in COLUNAS_DATA:
+            campos.append((coluna, pa.date32()))
+        elif coluna in COLUNAS_MONETARIAS:
+            campos.append((coluna, pa.float64()))
+        else:
+            campos.append((coluna, pa.string()))
+    return pa.schema(campos)
+
+def _criar_tabela_importacoes(conn):
+    """Cria a tabela que guarda o avanço de cada importação"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS importacoes (
+            arquivo TEXT PRIMARY KEY,
+            tabela TEXT,
+            tamanho_bytes BIGINT,
+            mtime DOUBLE,
+            linhas BIGINT,
+            concluida BOOLEAN,
+            atualizado_em TIMESTAMP
+        )
+    """)
+
+def importar_arquivo(conn, caminho, tabela='despesas_receitas', tamanho_lote=TAMANHO_LOTE,
+                     reiniciar=False, ao_progredir=None):
+    """
+    Importa o arquivo para a tabela em lotes, continuando de onde uma
+    importação interrompida do mesmo arquivo parou.
+    ao_progredir(linhas_lidas, linhas_gravadas) é chamada a cada lote.
+    Retorna as linhas lidas, gravadas e rejeitadas, a linha de onde a
+    importação foi retomada e até LIMITE_ERROS_RELATADOS valores inválidos
+    (linha do arquivo, coluna, valor e motivo).
+    """
+    arquivo = os.path.abspath(caminho)
+    estado = os.stat(arquivo)
+    _criar_tabela_importacoes(conn)
+
+    anterior = conn.execute(
+        "SELECT tamanho_bytes, mtime, linhas, concluida FROM importacoes WHERE arquivo = ?", (arquivo,)
+    ).fetchone()
+    mesmo_arquivo = anterior is not None and anterior[0] == estado.st_size and anterior[1] == estado.st_mtime
+
+    resumo = {'lidas': 0, 'gravadas': 0, 'rejeitadas': 0, 'retomada_em': 0, 'erros': []}
+    if anterior is not None and not reiniciar:
+        if not mesmo_arquivo:
+            raise ValueError(
+                f"{caminho} mudou desde a importação anterior ({anterior[2]} linhas lidas); "
+                "use reiniciar para importá-lo do início"
+            )
+        if anterior[3]:
+            logging.info(f"{caminho} já foi importado")
+            resumo['retomada_em'] = resumo['lidas'] = anterior[2]
+            resumo['erros'] = pd.DataFrame(columns=['linha', 'coluna', 'valor', 'motivo'])
+            return resumo
+        resumo['retomada_em'] = anterior[2]
+
+    if anterior is None:
+        conn.execute(
+            "INSERT INTO importacoes VALUES (?, ?, ?, ?, 0, FALSE, now())",
+            (arquivo, tabela, estado.st_size, estado.st_mtime)
+        )
+    elif reiniciar or not mesmo_arquivo:
+        conn.execute(
+            "UPDATE importacoes SET tabela = ?, tamanho_bytes = ?, mtime = ?, linhas = 0, "
+            "concluida = FALSE, atualizado_em = now() WHERE arquivo = ?",
+            (tabela, estado.st_size, estado.st_mtime, arquivo)
+        )
+
+    lidas = resumo['retomada_em']
+    for lote in ler_lotes(arquivo, tamanho_lote, pular=lidas):
+        # Índice = linha do arquivo (o cabeçalho é a linha 1), usado no relatório
+        lote.index = pd.RangeIndex(lidas + 2, lidas + 2 + len(lote))
+        lidas += len(lote)
+        lote, erros = _padronizar_lote(lote)
+        if not erros.empty:
+            lote = lote[~lote.index.isin(erros['linha'])]
+            resumo['rejeitadas'] += erros['linha'].nunique()
+            espaco = LIMITE_ERROS_RELATADOS - sum(len(relatados) for relatados in resumo['erros'])
+            if espaco > 0:
+                resumo['erros'].append(erros.head(espaco))
+
+        registros = pa.Table.from_pandas(lote, preserve_index=False).cast(_esquema(lote.columns))
+
+        # Lote e avanço gravados juntos: uma interrupção perde no máximo o lote atual
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            conn.register('lote_importado', registros)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela} AS SELECT * FROM lote_importado LIMIT 0")
+            conn.execute(f"INSERT INTO {tabela} BY NAME SELECT * FROM lote_importado")
+            conn.execute(
+                "UPDATE importacoes SET linhas = ?, atualizado_em = now() WHERE arquivo = ?",
+                (lidas, arquivo)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            desfazer_transacao(conn)
+            raise
+        finally:
+            conn.unregister('lote_importado')
+
+        resumo['gravadas'] += len(lote)
+        if ao_progredir is not None:
+            ao_progredir(lidas, resumo['gravadas'])
+
+    conn.execute(
+        "UPDATE importacoes SET linhas = ?, concluida = TRUE, atualizado_em = now() WHERE arquivo = ?",
+        (lidas, arquivo)
+    )
+    resumo['lidas'] = lidas
+    if resumo['erros']:
+        resumo['erros'] = pd.concat(resumo['erros'], ignore_index=True)
+    else:
+        resumo['erros'] = pd.DataFrame(columns=['linha', 'coluna', 'valor', 'motivo'])
+    return resumo
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    argumentos = sys.argv[1:]
+    if not argumentos or argumentos[0].startswith('--'):
+        print(__doc__)
+        sys.exit(1)
+
+    def opcao(nome, padrao):
+        return argumentos[argumentos.index(nome) + 1] if nome in argumentos else padrao
+
+    conn = duckdb.connect(database=opcao('--banco', 'airbnb.duckdb'))
+    inicio = time.perf_counter()
+    resumo = importar_arquivo(
+        conn, argumentos[0],
+        tabela=opcao('--tabela', 'despesas_receitas'),
+        tamanho_lote=int(opcao('--tamanho-lote', TAMANHO_LOTE)),
+        reiniciar='--reiniciar' in argumentos,
+        ao_progredir=lambda lidas, gravadas: logging.info(f"{lidas} linhas lidas, {gravadas} gravadas")
+    )
+    conn.close()
+
+    if resumo['retomada_em']:
+        print(f"Importação retomada na linha de dados {resumo['retomada_em'] + 1}")
+    print(f"{resumo['lidas']} linhas lidas, {resumo['gravadas']} gravadas e "
+          f"{resumo['rejeitadas']} rejeitadas em {time.perf_counter() - inicio:.2f} s")
+    for erro in resumo['erros'].itertuples(index=False):
+        print(f"  linha {erro.linha}, {erro.coluna}: {erro.motivo} ({erro.valor!r})")
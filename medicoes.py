@@ -0,0 +1,91 @@
+"""
+Medições dos atletas (força muscular, amplitude de movimento, dor, edema).
+
+As medições ficam na tabela medicoes, uma linha por paciente, tipo e data.
+As planilhas de dados_atletas (dados_<tipo>.xlsx, colunas Data e Valor)
+podem ser importadas para um paciente com importar_medicoes. Medições já
+existentes (mesmo paciente, tipo e data) não são duplicadas, e nenhuma é
+alterada ou removida, o que mantém os backups incrementais válidos.
+"""
+import os
+import logging
+import pandas as pd
+import pyarrow as pa
+from banco import desfazer_transacao
+from importacao import ler_em_paralelo
+
+DIRETORIO_MEDICOES = 'dados_atletas'
+
+# Tipo de medição (nome usado no arquivo e no banco) e seu rótulo na interface
+TIPOS_MEDICAO = {
+    'forca_muscular': 'Força Muscular',
+    'amplitude_de_movimento': 'Amplitude de Movimento',
+    'dor': 'Dor',
+    'edema': 'Edema'
+}
+
+# Sentido de melhora de cada tipo: 1 quando o valor deve subir, -1 quando deve cair
+SENTIDO_MELHORA = {
+    'forca_muscular': 1,
+    'amplitude_de_movimento': 1,
+    'dor': -1,
+    'edema': -1
+}
+
+ESQUEMA_MEDICOES = pa.schema([
+    ('data', pa.timestamp('us')),
+    ('valor', pa.float64())
+])
+
+def ler_medicoes(caminho):
+    """Lê uma planilha de medições e retorna uma tabela Arrow com data e valor"""
+    df = pd.read_excel(caminho, usecols=['Data', 'Valor'])
+    df = pd.DataFrame({
+        'data': pd.to_datetime(df['Data']),
+        'valor': pd.to_numeric(df['Valor'], errors='coerce')
+    }).dropna()
+    return pa.Table.from_pandas(df, schema=ESQUEMA_MEDICOES, preserve_index=False)
+
+def importar_medicoes(conn, paciente_id, diretorio=DIRETORIO_MEDICOES, trabalhadores=None):
+    """
+    Importa as planilhas dados_<tipo>.xlsx do diretório para o paciente.
+    Retorna a quantidade de medições inseridas por tipo e os arquivos que
+    não puderam ser lidos.
+    """
+    resumo = {'inseridas': {}, 'erros': {}}
+    caminhos = {
+        os.path.join(diretorio, f"dados_{tipo}.xlsx"): tipo
+        for tipo in TIPOS_MEDICAO
+        if os.path.exists(os.path.join(diretorio, f"dados_{tipo}.xlsx"))
+    }
+
+    for caminho, registros, _, erro in ler_em_paralelo(ler_medicoes, list(caminhos), trabalhadores):
+        tipo = caminhos[caminho]
+        if erro:
+            logging.error(f"Erro ao ler as medições de {caminho}: {erro}")
+            resumo['erros'][os.path.basename(caminho)] = erro
+            continue
+
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            conn.register('medicoes_importadas', registros)
+            # O INSERT retorna a quantidade de linhas inseridas
+            inseridas = conn.execute("""
+                INSERT INTO medicoes (paciente_id, tipo, data, valor)
+                SELECT ?, ?, i.data, i.valor
+                FROM medicoes_importadas i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM medicoes m
+                    WHERE m.paciente_id = ? AND m.tipo = ? AND m.data = i.data
+                )
+                ORDER BY i.data
+            """, (paciente_id, tipo, paciente_id, tipo)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            desfazer_transacao(conn)
+            raise
+        finally:
+            conn.unregister('medicoes_importadas')
+        resumo['inseridas'][tipo] = inseridas
+
+    return resumo
@@ -1,8 +1,9 @@
 import duckdb
-import pandas as pd
-from datetime import datetime
 import logging
 import time
+from banco import desfazer_transacao
+from datas import padronizar_data, texto_sql_data, expressao_sql_data
+from padronizacao import COLUNAS_DATA
 
 # Configurar logging
 logging.basicConfig(
@@ -10,81 +11,75 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def converter_data(data_str):
-    try:
-        if pd.isna(data_str):
-            return None
-        
-        # Lista de formatos possíveis de data
-        formatos = [
-            '%d/%m/%Y',
-            '%Y-%m-%d',
-            '%d-%m-%Y',
-            '%d/%m/%y',
-            '%Y/%m/%d'
-        ]
-        
-        # Tentar cada formato até encontrar um que funcione
-        for formato in formatos:
-            try:
-                return datetime.strptime(str(data_str).strip(), formato).strftime('%Y-%m-%d')
-            except:
-                continue
-        
-        logging.warning(f"Formato de data não reconhecido: {data_str}")
-        return None
-    except Exception as e:
-        logging.error(f"Erro ao converter data {data_str}: {e}")
-        return None
+# Conversão de um único valor, mantida com o nome antigo
+converter_data = padronizar_data
 
-def padronizar_datas():
+def padronizar_datas(banco='airbnb.duckdb', tabela='despesas_receitas'):
+    """
+    Converte as colunas de data da tabela para DATE dentro do próprio
+    DuckDB, com um único CREATE OR REPLACE TABLE ... AS SELECT em uma
+    transação. Os dados não passam pelo Python, então a tabela pode ser
+    maior que a memória (o DuckDB usa o disco quando precisa).
+    """
     conn = None
     try:
         # Conectar ao banco de dados
         logging.info("Conectando ao banco de dados DuckDB...")
-        conn = duckdb.connect(database='airbnb.duckdb')
-        
-        # Ler os dados atuais
-        logging.info("Lendo dados da tabela...")
-        df = conn.execute("SELECT * FROM despesas_receitas").fetchdf()
+        conn = duckdb.connect(database=banco)
         
-        # Colunas de data para padronizar
-        colunas_data = ['data_entrada', 'data_saida']
+        tipos = {linha[0]: linha[1] for linha in conn.execute(f"DESCRIBE {tabela}").fetchall()}
         
-        # Criar uma nova tabela temporária com a estrutura correta
-        logging.info("Criando tabela temporária...")
-        conn.execute("""
-            CREATE TEMP TABLE temp_despesas_receitas AS 
-            SELECT * FROM despesas_receitas 
-            WHERE 1=0
-        """)
-        
-        # Converter cada coluna de data no DataFrame
-        for coluna in colunas_data:
-            if coluna in df.columns:
-                logging.info(f"Padronizando formato da coluna {coluna}...")
-                df[coluna] = df[coluna].apply(converter_data)
+        # Conversão de cada coluna de data (as que já são DATE ficam como
+        # estão). O texto sem espaços é calculado uma única vez por linha,
+        # em uma coluna auxiliar _texto_<coluna>
+        conversoes = {}
+        textos = {}
+        for coluna in COLUNAS_DATA:
+            if coluna not in tipos or tipos[coluna] == 'DATE':
+                continue
+            if tipos[coluna].startswith('TIMESTAMP'):
+                conversoes[coluna] = f"CAST({coluna} AS DATE)"
+            else:
+                textos[f"_texto_{coluna}"] = texto_sql_data(coluna)
+                conversoes[coluna] = expressao_sql_data(f"_texto_{coluna}")
         
-        # Inserir dados convertidos na tabela temporária
-        logging.info("Inserindo dados na tabela temporária...")
-        conn.execute("INSERT INTO temp_despesas_receitas SELECT * FROM df")
+        if not conversoes:
+            logging.info("Nenhuma coluna de data a padronizar.")
+            return
         
-        # Alterar o tipo das colunas para DATE na tabela temporária
-        for coluna in colunas_data:
-            if coluna in df.columns:
-                logging.info(f"Alterando tipo da coluna {coluna} para DATE...")
-                conn.execute(f"ALTER TABLE temp_despesas_receitas ALTER COLUMN {coluna} TYPE DATE")
+        contagem = f"SELECT {', '.join(f'COUNT({coluna})' for coluna in conversoes)} FROM {tabela}"
+        substituicoes = ', '.join(f"{expressao} AS {coluna}" for coluna, expressao in conversoes.items())
+        if textos:
+            auxiliares = ', '.join(f"{expressao} AS {nome}" for nome, expressao in textos.items())
+            origem = f"(SELECT *, {auxiliares} FROM {tabela})"
+            selecao = f"* EXCLUDE ({', '.join(textos)}) REPLACE ({substituicoes})"
+        else:
+            origem = tabela
+            selecao = f"* REPLACE ({substituicoes})"
         
-        # Substituir a tabela original pela temporária
-        logging.info("Substituindo tabela original...")
-        conn.execute("DROP TABLE despesas_receitas")
-        conn.execute("ALTER TABLE temp_despesas_receitas RENAME TO despesas_receitas")
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            preenchidos = conn.execute(contagem).fetchone()
+            
+            logging.info(f"Padronizando as colunas {', '.join(conversoes)}...")
+            conn.execute(f"CREATE OR REPLACE TABLE {tabela} AS SELECT {selecao} FROM {origem}")
+            
+            # Valores preenchidos que nenhum formato reconhece viram NULL
+            convertidos = conn.execute(contagem).fetchone()
+            for coluna, antes, depois in zip(conversoes, preenchidos, convertidos):
+                if antes != depois:
+                    logging.warning(f"{antes - depois} data(s) em formato não reconhecido na coluna {coluna}")
+            conn.execute("COMMIT")
+        except Exception:
+            desfazer_transacao(conn)
+            raise
         
         # Verificar resultado
         logging.info("Verificando dados padronizados...")
-        resultado = conn.execute("SELECT * FROM despesas_receitas").fetchdf()
-        print("\nDados após padronização:")
-        print(resultado)
+        total = conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+        amostra = conn.execute(f"SELECT * FROM {tabela} LIMIT 10").fetchdf()
+        print(f"\nDados após padronização ({total} registros, primeiros 10):")
+        print(amostra)
         
         logging.info("Processo de padronização concluído com sucesso!")
         
@@ -98,4 +93,4 @@ def padronizar_datas():
                 pass
 
 if __name__ == "__main__":
-    padronizar_datas() 
\ No newline at end of file
+    padronizar_datas()
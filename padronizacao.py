@@ -1,37 +1,40 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
 import logging
+from datas import padronizar_data, padronizar_coluna_datas
 
-def padronizar_data(data_str):
-    """
-    Converte uma string de data para o formato YYYY-MM-DD.
-    Aceita múltiplos formatos de entrada.
-    """
-    try:
-        if pd.isna(data_str):
-            return None
-        
-        # Lista de formatos possíveis de data
-        formatos = [
-            '%d/%m/%Y',
-            '%Y-%m-%d',
-            '%d-%m-%Y',
-            '%d/%m/%y',
-            '%Y/%m/%d'
-        ]
-        
-        # Tentar cada formato até encontrar um que funcione
-        for formato in formatos:
-            try:
-                return datetime.strptime(str(data_str).strip(), formato).strftime('%Y-%m-%d')
-            except:
-                continue
-        
-        logging.warning(f"Formato de data não reconhecido: {data_str}")
-        return None
-    except Exception as e:
-        logging.error(f"Erro ao converter data {data_str}: {e}")
-        return None
+# Colunas de cada tipo padronizadas por padronizar_dataframe
+COLUNAS_DATA = ['data_entrada', 'data_saida']
+COLUNAS_MONETARIAS = [
+    'valor_fechado',
+    'taxa_plataforma',
+    'taxa_admin',
+    'taxa_reloc',
+    'limpeza',
+    'taxa_indicacao',
+    'lucro'
+]
+COLUNAS_BOOLEANAS = ['recebido']
+
+# Colunas exigidas por relatorio_validacao
+COLUNAS_OBRIGATORIAS = [
+    'data_entrada',
+    'data_saida',
+    'valor_fechado',
+    'recebido'
+]
+
+# Textos reconhecidos por padronizar_booleano
+VALORES_SIM = ['SIM', 'S', 'TRUE', '1', 'T', 'YES', 'Y']
+VALORES_NAO = ['NÃO', 'NAO', 'N', 'FALSE', '0', 'F', 'NO']
+
+# Resultados de infer_dtype para colunas de objetos que só contêm números
+TIPOS_NUMERICOS_INFERIDOS = ['empty', 'floating', 'integer', 'mixed-integer-float', 'boolean']
+
+# Número decimal sem espaços, aceito tanto pelo Arrow quanto pelo float
+NUMERO_DECIMAL = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
 
 def padronizar_valor_monetario(valor):
     """
@@ -41,12 +44,22 @@ def padronizar_valor_monetario(valor):
     try:
         if pd.isna(valor):
             return 0.0
-        # Remove R$, pontos e espaços, substitui vírgula por ponto
-        valor_limpo = str(valor).replace('R$', '').replace('.', '').replace(',', '.').strip()
-        return float(valor_limpo)
+        return float(_limpar_valor_monetario(valor))
     except:
         return 0.0
 
+def _limpar_valor_monetario(valor):
+    """Remove R$, pontos e espaços e substitui vírgula por ponto"""
+    return str(valor).replace('R$', '').replace('.', '').replace(',', '.').strip()
+
+def _monetario_valido(valor):
+    """Indica se o texto é convertido em número por padronizar_valor_monetario"""
+    try:
+        float(_limpar_valor_monetario(valor))
+        return True
+    except ValueError:
+        return False
+
 def padronizar_booleano(valor):
     """
     Converte valores como 'SIM', 'NÃO', 'S', 'N' para string padronizada.
@@ -55,99 +68,202 @@ def padronizar_booleano(valor):
         return None
     
     valor = str(valor).strip().upper()
-    if valor in ['SIM', 'S', 'TRUE', '1', 'T', 'YES', 'Y']:
+    if valor in VALORES_SIM:
         return 'SIM'
-    elif valor in ['NÃO', 'NAO', 'N', 'FALSE', '0', 'F', 'NO']:
+    elif valor in VALORES_NAO:
         return 'NÃO'
     return None
 
-def padronizar_dataframe(df):
+def padronizar_coluna_monetaria(serie):
     """
-    Padroniza todas as colunas do DataFrame conforme seus tipos.
+    Converte uma coluna inteira de valores monetários para float, com o
+    mesmo resultado de aplicar padronizar_valor_monetario a cada valor.
+    A limpeza e a conversão são feitas pelo pyarrow.compute.
     """
-    # Colunas de data
-    colunas_data = ['data_entrada', 'data_saida']
+    resultado = np.zeros(len(serie), dtype=float)
+    valores = serie.to_numpy(dtype=object)
+    posicoes = np.flatnonzero(~pd.isna(valores))
+    textos = pa.array([v if v.__class__ is str else str(v) for v in valores[posicoes]], pa.string())
     
-    # Colunas monetárias
-    colunas_monetarias = [
-        'valor_fechado',
-        'taxa_plataforma',
-        'taxa_admin',
-        'taxa_reloc',
-        'limpeza',
-        'taxa_indicacao',
-        'lucro'
-    ]
+    # Remove R$ e pontos, troca vírgula por ponto e retira os espaços
+    for antigo, novo in [('R$', ''), ('.', ''), (',', '.')]:
+        textos = pc.replace_substring(textos, antigo, novo)
+    textos = pc.utf8_trim_whitespace(textos)
     
-    # Colunas booleanas
-    colunas_booleanas = ['recebido']
+    # Números decimais simples são convertidos pelo Arrow, que arredonda
+    # como o float do Python
+    decimais = pc.match_substring_regex(textos, NUMERO_DECIMAL).to_numpy(zero_copy_only=False)
+    resultado[posicoes[decimais]] = pc.cast(textos.filter(pa.array(decimais)), pa.float64()).to_numpy()
     
+    # Os demais (vazios, texto, formatos que só o float aceita) valor a valor;
+    # os que não são números ficam com 0.0
+    for posicao, texto in zip(posicoes[~decimais], textos.filter(pa.array(~decimais)).to_pylist()):
+        try:
+            resultado[posicao] = float(texto)
+        except ValueError:
+            pass
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+def padronizar_coluna_booleana(serie):
+    """
+    Converte uma coluna inteira para 'SIM', 'NÃO' ou None, com o mesmo
+    resultado de aplicar padronizar_booleano a cada valor. Cada texto
+    distinto é convertido uma única vez.
+    """
+    resultado = np.full(len(serie), None, dtype=object)
+    posicoes = np.flatnonzero(serie.notna().to_numpy())
+    codigos, unicos = pd.factorize(serie.iloc[posicoes].map(str))
+    categorias = pd.Series(unicos, dtype=object).str.strip().str.upper()
+    convertidos = np.full(len(unicos), None, dtype=object)
+    convertidos[categorias.isin(VALORES_SIM).to_numpy()] = 'SIM'
+    convertidos[categorias.isin(VALORES_NAO).to_numpy()] = 'NÃO'
+    resultado[posicoes] = convertidos[codigos]
+    return pd.Series(resultado, index=serie.index, dtype=object, name=serie.name)
+
+def padronizar_dataframe(df):
+    """
+    Padroniza todas as colunas do DataFrame conforme seus tipos.
+    """
     # Padronizar datas
-    for coluna in colunas_data:
+    for coluna in COLUNAS_DATA:
         if coluna in df.columns:
-            df[coluna] = df[coluna].apply(padronizar_data)
+            df[coluna] = padronizar_coluna_datas(df[coluna])
     
     # Padronizar valores monetários
-    for coluna in colunas_monetarias:
+    for coluna in COLUNAS_MONETARIAS:
         if coluna in df.columns:
-            df[coluna] = df[coluna].apply(padronizar_valor_monetario)
+            df[coluna] = padronizar_coluna_monetaria(df[coluna])
     
     # Padronizar booleanos
-    for coluna in colunas_booleanas:
+    for coluna in COLUNAS_BOOLEANAS:
         if coluna in df.columns:
-            df[coluna] = df[coluna].apply(padronizar_booleano)
+            df[coluna] = padronizar_coluna_booleana(df[coluna])
     
     return df
 
+def _linhas_invalidas(df, coluna, invalidas, motivo):
+    """Linhas do relatório de validação para as posições inválidas da coluna"""
+    posicoes = np.flatnonzero(invalidas)
+    return pd.DataFrame({
+        'linha': df.index[posicoes],
+        'coluna': coluna,
+        'valor': df[coluna].iloc[posicoes].to_numpy(dtype=object),
+        'motivo': motivo
+    })
+
+def relatorio_validacao(df):
+    """
+    Verifica todas as colunas do DataFrame de uma vez, sem parar no
+    primeiro problema. Retorna um dicionário com 'valido', as
+    'colunas_ausentes' e 'erros', um DataFrame com linha (índice), coluna,
+    valor e motivo de cada valor inválido.
+    """
+    colunas_ausentes = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in df.columns]
+    erros = []
+    
+    # Datas devem ser textos no formato YYYY-MM-DD (10 caracteres com hífens)
+    for coluna in COLUNAS_DATA:
+        if coluna not in df.columns:
+            continue
+        serie = df[coluna]
+        preenchidas = serie.notna().to_numpy()
+        if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+            formato_ok = np.zeros(len(serie), dtype=bool)
+        else:
+            # O formato é verificado uma vez por valor distinto
+            codigos, unicos = pd.factorize(serie.astype(object))
+            unicos_ok = pd.Series(unicos, dtype=object).str.fullmatch(r'(?s).{4}-.{2}-.{2}', na=False).to_numpy()
+            formato_ok = np.append(unicos_ok, False)[codigos]
+        erros.append(_linhas_invalidas(df, coluna, preenchidas & ~formato_ok, 'data fora do formato YYYY-MM-DD'))
+    
+    # Valores monetários devem ser números (int ou float)
+    for coluna in COLUNAS_MONETARIAS:
+        if coluna not in df.columns:
+            continue
+        serie = df[coluna]
+        # Colunas numéricas ou booleanas, ou de objetos que são todos
+        # números, não precisam ser verificadas valor a valor
+        if pd.api.types.is_numeric_dtype(serie):
+            continue
+        valores = serie.to_numpy(dtype=object)
+        if pd.api.types.infer_dtype(valores, skipna=True) in TIPOS_NUMERICOS_INFERIDOS:
+            continue
+        # O tipo de cada valor é verificado uma vez por tipo distinto
+        tipos = pd.Series(np.frompyfunc(type, 1, 1)(valores), dtype=object)
+        numericos = [tipo for tipo in tipos.unique() if issubclass(tipo, (int, float, np.number, np.bool_))]
+        invalidas = ~pd.isna(valores) & ~tipos.isin(numericos).to_numpy()
+        erros.append(_linhas_invalidas(df, coluna, invalidas, 'valor monetário não numérico'))
+    
+    erros = [linhas for linhas in erros if not linhas.empty]
+    if erros:
+        erros = pd.concat(erros, ignore_index=True)
+    else:
+        erros = pd.DataFrame(columns=['linha', 'coluna', 'valor', 'motivo'])
+    return {
+        'valido': not colunas_ausentes and erros.empty,
+        'colunas_ausentes': colunas_ausentes,
+        'erros': erros
+    }
+
+def erros_padronizacao(original, padronizado):
+    """
+    Compara o DataFrame original com o resultado de padronizar_dataframe e
+    retorna, no formato de relatorio_validacao()['erros'], os valores
+    preenchidos que a padronização descartou: datas não reconhecidas (que
+    viram None), textos monetários que não são números (que viram 0.0) e
+    booleanos não reconhecidos (que viram None). O valor relatado é o
+    original.
+    """
+    erros = []
+    
+    # Datas e booleanos preenchidos (texto não vazio) que viraram None
+    for colunas, motivo in [(COLUNAS_DATA, 'data em formato não reconhecido'),
+                            (COLUNAS_BOOLEANAS, 'valor booleano não reconhecido')]:
+        for coluna in colunas:
+            if coluna not in original.columns:
+                continue
+            invalidas = (original[coluna].notna() & padronizado[coluna].isna()).to_numpy()
+            # Textos só com espaços contam como vazios
+            valores = original[coluna].to_numpy(dtype=object)[invalidas]
+            invalidas[invalidas] = [str(valor).strip() != '' for valor in valores]
+            erros.append(_linhas_invalidas(original, coluna, invalidas, motivo))
+    
+    # Textos monetários que viraram 0.0 sem representar um número; só os
+    # zeros são verificados, valor a valor
+    for coluna in COLUNAS_MONETARIAS:
+        if coluna not in original.columns:
+            continue
+        valores = original[coluna].to_numpy(dtype=object)
+        zeros = np.flatnonzero(padronizado[coluna].to_numpy() == 0.0)
+        invalidas = np.zeros(len(valores), dtype=bool)
+        invalidas[zeros] = [
+            isinstance(valor, str) and valor.strip() != '' and not _monetario_valido(valor)
+            for valor in valores[zeros]
+        ]
+        erros.append(_linhas_invalidas(original, coluna, invalidas, 'valor monetário não reconhecido'))
+    
+    erros = [linhas for linhas in erros if not linhas.empty]
+    if erros:
+        return pd.concat(erros, ignore_index=True)
+    return pd.DataFrame(columns=['linha', 'coluna', 'valor', 'motivo'])
+
 def validar_dados(df):
     """
     Valida os dados do DataFrame antes de inserir no banco.
     Retorna True se os dados são válidos, False caso contrário.
+    Os problemas encontrados são registrados no log; use
+    relatorio_validacao para obter todos eles.
     """
     try:
-        # Verificar se todas as colunas necessárias existem
-        colunas_obrigatorias = [
-            'data_entrada',
-            'data_saida',
-            'valor_fechado',
-            'recebido'
-        ]
-        
-        for coluna in colunas_obrigatorias:
-            if coluna not in df.columns:
-                logging.error(f"Coluna obrigatória ausente: {coluna}")
-                return False
+        relatorio = relatorio_validacao(df)
         
-        # Verificar se as datas são válidas
-        for coluna in ['data_entrada', 'data_saida']:
-            datas_invalidas = df[df[coluna].notna()][coluna].apply(
-                lambda x: not isinstance(x, str) or len(x) != 10 or x[4] != '-' or x[7] != '-'
-            )
-            if datas_invalidas.any():
-                logging.error(f"Datas inválidas encontradas na coluna {coluna}")
-                return False
+        for coluna in relatorio['colunas_ausentes']:
+            logging.error(f"Coluna obrigatória ausente: {coluna}")
         
-        # Verificar se os valores monetários são números
-        colunas_monetarias = [
-            'valor_fechado',
-            'taxa_plataforma',
-            'taxa_admin',
-            'taxa_reloc',
-            'limpeza',
-            'taxa_indicacao',
-            'lucro'
-        ]
-        
-        for coluna in colunas_monetarias:
-            if coluna in df.columns:
-                valores_invalidos = df[df[coluna].notna()][coluna].apply(
-                    lambda x: not isinstance(x, (int, float))
-                )
-                if valores_invalidos.any():
-                    logging.error(f"Valores monetários inválidos encontrados na coluna {coluna}")
-                    return False
+        for (coluna, motivo), quantidade in relatorio['erros'].groupby(['coluna', 'motivo']).size().items():
+            logging.error(f"{quantidade} linha(s) com {motivo} na coluna {coluna}")
         
-        return True
+        return relatorio['valido']
     except Exception as e:
         logging.error(f"Erro durante a validação dos dados: {e}")
-        return False 
\ No newline at end of file
+        return False
@@ -0,0 +1,321 @@
+"""
+Importação das planilhas de protocolo (planilhas_originais) para o banco.
+
+Cada planilha é lida uma única vez e gravada nas tabelas protocolos,
+protocolo_fases, protocolo_exercicios e protocolo_criterios. O tamanho, a
+data de modificação e a soma SHA-256 do arquivo ficam registrados em
+protocolos: arquivos com tamanho e data inalterados nem são abertos, e
+arquivos apenas tocados (mesma soma) não são lidos de novo.
+
+As planilhas alteradas são lidas em paralelo (ver importacao.py).
+
+O conteúdo das planilhas para download é guardado em memória pela soma
+SHA-256 (conteudo_protocolo), e só é lido quando o arquivo muda.
+"""
+import os
+import re
+import functools
+import logging
+import threading
+import warnings
+import openpyxl
+import pyarrow as pa
+from banco import desfazer_transacao
+from backup import sha256_arquivo
+from importacao import ler_em_paralelo
+
+DIRETORIO_PROTOCOLOS = 'planilhas_originais'
+
+# Uma sincronização por vez no processo: sessões simultâneas gravariam os
+# mesmos protocolos e uma delas falharia por conflito de transação
+_sincronizacao_lock = threading.Lock()
+
+# Rótulos do cabeçalho do calendário que não são critérios do protocolo
+ROTULOS_IGNORADOS = ('Indiçe de pico', 'Oponente o atividade')
+
+ESQUEMAS = {
+    'protocolo_fases': pa.schema([
+        ('ordem', pa.int32()),
+        ('fase', pa.string()),
+        ('descricao', pa.string()),
+        ('microciclo_inicio', pa.int32()),
+        ('microciclo_fim', pa.int32())
+    ]),
+    'protocolo_exercicios': pa.schema([
+        ('linha', pa.int32()),
+        ('area', pa.string()),
+        ('exercicio', pa.string()),
+        ('fase', pa.string()),
+        ('microciclo', pa.int32()),
+        ('prescricao', pa.string())
+    ]),
+    'protocolo_criterios': pa.schema([
+        ('linha', pa.int32()),
+        ('criterio', pa.string()),
+        ('microciclo', pa.int32()),
+        ('descricao', pa.string())
+    ])
+}
+
+def _texto(valor):
+    """Normaliza o conteúdo de uma célula como texto (None se vazia)"""
+    if valor is None:
+        return None
+    if hasattr(valor, 'date'):
+        return valor.date().isoformat()
+    texto = ' '.join(str(valor).split())
+    return texto or None
+
+def _numeros_fase(nome):
+    """Números de fase cobertos por um rótulo como 'FASE 1-2' ou 'FASE 3 (7 DIAS)'"""
+    correspondencia = re.match(r'FASE\s*(\d+)(?:\s*-\s*(\d+))?', nome or '', re.IGNORECASE)
+    if not correspondencia:
+        return set()
+    inicio = int(correspondencia.group(1))
+    fim = int(correspondencia.group(2) or inicio)
+    return set(range(inicio, fim + 1))
+
+def _inicios_fases(linha, colunas):
+    """Colunas em que cada fase começa, a partir de uma linha 'FASE'"""
+    return [(j, _texto(linha[j])) for j in sorted(colunas) if j < len(linha) and _texto(linha[j])]
+
+def _fase_da_coluna(inicios, coluna):
+    """Fase em vigor em uma coluna (a última que começou até ela)"""
+    fase = None
+    for inicio, nome in inicios:
+        if inicio > coluna:
+            break
+        fase = nome
+    return fase
+
+def ler_protocolo(caminho):
+    """
+    Lê a aba Calendario de uma planilha de protocolo e retorna o título e
+    as tabelas Arrow de fases, exercícios e critérios (uma linha por
+    microciclo), prontas para serem gravadas no banco.
+    """
+    with warnings.catch_warnings():
+        # As planilhas usam extensões de formatação que o openpyxl ignora
+        warnings.simplefilter('ignore', UserWarning)
+        wb = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+        try:
+            linhas = [tuple(linha) for linha in wb['Calendario'].iter_rows(values_only=True)]
+        finally:
+            wb.close()
+
+    def celula(i, j):
+        return _texto(linhas[i][j]) if j < len(linhas[i]) else None
+
+    titulo = celula(0, 1) or os.path.splitext(os.path.basename(caminho))[0]
+
+    # Colunas de dados: a linha Microciclo numera cada semana do calendário
+    linha_microciclo = next(i for i in range(len(linhas)) if celula(i, 1) == 'Microciclo')
+    colunas = {
+        j: int(v) for j, v in enumerate(linhas[linha_microciclo])
+        if j >= 3 and isinstance(v, (int, float))
+    }
+    areas = [i for i in range(linha_microciclo + 1, len(linhas)) if celula(i, 0)]
+    fim_cabecalho = areas[0] if areas else len(linhas)
+
+    # Fases: início pela linha FASE do cabeçalho, duração pelos rótulos 'FASE n (...)'
+    linha_fases = next(i for i in range(linha_microciclo) if celula(i, 1) == 'FASE')
+    inicios = _inicios_fases(linhas[linha_fases], colunas)
+    coluna_alta = next(
+        (j for j in sorted(colunas) for i in range(linha_microciclo) if celula(i, j) == 'ALTA'),
+        None
+    )
+    rotulos_fases = []
+    for i in range(linha_microciclo + 1, fim_cabecalho):
+        for j in (1, 2):
+            if _numeros_fase(celula(i, j)):
+                rotulos_fases.append((i, celula(i, j)))
+
+    fases = []
+    for ordem, (inicio, nome) in enumerate(inicios, start=1):
+        if ordem < len(inicios):
+            fim = colunas[inicios[ordem][0]] - 1
+        else:
+            fim = colunas[coluna_alta] if coluna_alta is not None and coluna_alta >= inicio else None
+        numeros = _numeros_fase(nome)
+        descricao = '; '.join(
+            rotulo for _, rotulo in rotulos_fases if _numeros_fase(rotulo) & numeros
+        )
+        fases.append({
+            'ordem': ordem,
+            'fase': nome,
+            'descricao': descricao or None,
+            'microciclo_inicio': colunas[inicio],
+            'microciclo_fim': fim
+        })
+
+    # Critérios: demais linhas do cabeçalho (exames, testes, liberação médica)
+    linhas_fases = {i for i, _ in rotulos_fases}
+    criterios = []
+    criterio = None
+    for i in range(linha_microciclo + 1, fim_cabecalho):
+        if i in linhas_fases:
+            continue
+        rotulo = celula(i, 1)
+        if rotulo and not isinstance(linhas[i][1], (int, float)):
+            criterio = rotulo.rstrip(':').strip()
+        if not criterio or criterio in ROTULOS_IGNORADOS:
+            continue
+        for j in sorted(colunas):
+            descricao = celula(i, j)
+            if descricao:
+                criterios.append({
+                    'linha': i,
+                    'criterio': criterio,
+                    'microciclo': colunas[j],
+                    'descricao': descricao
+                })
+
+    # Exercícios: um bloco por área (Fisioterapia, Preparação física, ...)
+    exercicios = []
+    for posicao, inicio_area in enumerate(areas):
+        fim_area = areas[posicao + 1] if posicao + 1 < len(areas) else len(linhas)
+        area = celula(inicio_area, 0)
+        inicios_area = inicios
+        for i in range(inicio_area + 1, fim_area):
+            if celula(i, 1) == 'FASE':
+                inicios_area = _inicios_fases(linhas[i], colunas)
+                continue
+            exercicio = celula(i, 2) or celula(i, 1)
+            if not exercicio or exercicio.startswith(('FASE/', 'Sub-Componente')):
+                continue
+            for j in sorted(colunas):
+                prescricao = celula(i, j)
+                if prescricao:
+                    exercicios.append({
+                        'linha': i,
+                        'area': area,
+                        'exercicio': exercicio,
+                        'fase': _fase_da_coluna(inicios_area, j),
+                        'microciclo': colunas[j],
+                        'prescricao': prescricao
+                    })
+
+    dados = {
+        'protocolo_fases': fases,
+        'protocolo_exercicios': exercicios,
+        'protocolo_criterios': criterios
+    }
+    resultado = {
+        tabela: pa.Table.from_pylist(dados[tabela], schema=esquema)
+        for tabela, esquema in ESQUEMAS.items()
+    }
+    resultado['titulo'] = titulo
+    return resultado
+
+@functools.lru_cache(maxsize=8)
+def conteudo_protocolo(caminho, hash_arquivo):
+    """
+    Bytes da planilha para download. O cache é endereçado pela soma do
+    conteúdo, então uma planilha alterada é lida de novo automaticamente.
+    """
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+def _gravar_protocolo(conn, arquivo, tamanho, mtime, hash_arquivo, dados):
+    """Substitui, em uma transação, o protocolo e suas fases, exercícios e critérios"""
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        registro = conn.execute("SELECT id FROM protocolos WHERE arquivo = ?", (arquivo,)).fetchone()
+        if registro:
+            protocolo_id = registro[0]
+            conn.execute("""
+                UPDATE protocolos
+                SET titulo = ?, tamanho_bytes = ?, mtime = ?, hash = ?, importado_em = current_timestamp
+                WHERE id = ?
+            """, (dados['titulo'], tamanho, mtime, hash_arquivo, protocolo_id))
+        else:
+            protocolo_id = conn.execute("""
+                INSERT INTO protocolos (arquivo, titulo, tamanho_bytes, mtime, hash, importado_em)
+                VALUES (?, ?, ?, ?, ?, current_timestamp)
+                RETURNING id
+            """, (arquivo, dados['titulo'], tamanho, mtime, hash_arquivo)).fetchone()[0]
+
+        for tabela, esquema in ESQUEMAS.items():
+            conn.execute(f"DELETE FROM {tabela} WHERE protocolo_id = ?", (protocolo_id,))
+            colunas = ", ".join(esquema.names)
+            conn.register('registros_protocolo', dados[tabela])
+            try:
+                conn.execute(f"""
+                    INSERT INTO {tabela} (protocolo_id, {colunas})
+                    SELECT {int(protocolo_id)}, {colunas} FROM registros_protocolo
+                """)
+            finally:
+                conn.unregister('registros_protocolo')
+        conn.execute("COMMIT")
+    except Exception:
+        desfazer_transacao(conn)
+        raise
+
+def _remover_protocolo(conn, protocolo_id):
+    """Remove um protocolo cujo arquivo não existe mais"""
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        for tabela in ESQUEMAS:
+            conn.execute(f"DELETE FROM {tabela} WHERE protocolo_id = ?", (protocolo_id,))
+        conn.execute("DELETE FROM protocolos WHERE id = ?", (protocolo_id,))
+        conn.execute("COMMIT")
+    except Exception:
+        desfazer_transacao(conn)
+        raise
+
+def importar_protocolos(conn, diretorio=DIRETORIO_PROTOCOLOS, forcar=False, trabalhadores=None):
+    """
+    Sincroniza as tabelas de protocolos com as planilhas do diretório.
+    Retorna um resumo com os arquivos importados, os inalterados, os
+    removidos, os que falharam e o tempo de leitura de cada planilha.
+    """
+    with _sincronizacao_lock:
+        return _sincronizar(conn, diretorio, forcar, trabalhadores)
+
+def _sincronizar(conn, diretorio, forcar, trabalhadores):
+    """Sincronização feita por importar_protocolos, já com o lock obtido"""
+    resumo = {'importados': [], 'inalterados': 0, 'removidos': [], 'erros': {}, 'tempos': {}}
+    registrados = {
+        arquivo: (protocolo_id, tamanho, mtime, hash_arquivo)
+        for arquivo, protocolo_id, tamanho, mtime, hash_arquivo in conn.execute("""
+            SELECT arquivo, id, tamanho_bytes, mtime, hash FROM protocolos
+        """).fetchall()
+    }
+    arquivos = sorted(f for f in os.listdir(diretorio) if f.endswith('.xlsx')) if os.path.isdir(diretorio) else []
+
+    alterados = {}
+    for arquivo in arquivos:
+        caminho = os.path.join(diretorio, arquivo)
+        estado = os.stat(caminho)
+        registro = registrados.get(arquivo)
+        if not forcar and registro and registro[1] == estado.st_size and registro[2] == estado.st_mtime:
+            resumo['inalterados'] += 1
+            continue
+
+        hash_arquivo = sha256_arquivo(caminho)
+        if not forcar and registro and registro[3] == hash_arquivo:
+            # Arquivo apenas tocado: atualiza a data sem ler a planilha
+            conn.execute(
+                "UPDATE protocolos SET mtime = ? WHERE id = ?", (estado.st_mtime, registro[0])
+            )
+            resumo['inalterados'] += 1
+            continue
+
+        alterados[caminho] = (arquivo, estado, hash_arquivo)
+
+    for caminho, dados, segundos, erro in ler_em_paralelo(ler_protocolo, list(alterados), trabalhadores):
+        arquivo, estado, hash_arquivo = alterados[caminho]
+        resumo['tempos'][arquivo] = segundos
+        if erro:
+            logging.error(f"Erro ao ler o protocolo {arquivo}: {erro}")
+            resumo['erros'][arquivo] = erro
+            continue
+        _gravar_protocolo(conn, arquivo, estado.st_size, estado.st_mtime, hash_arquivo, dados)
+        resumo['importados'].append(arquivo)
+
+    for arquivo, registro in registrados.items():
+        if arquivo not in arquivos:
+            _remover_protocolo(conn, registro[0])
+            resumo['removidos'].append(arquivo)
+
+    return resumo
@@ -3,18 +3,27 @@ import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime
-import base64
-import duckdb
-import yaml
 import plotly.express as px
 import plotly.graph_objects as go
 from analise_dados import (
+    carregar_progresso_paciente,
     gerar_relatorio_paciente,
     gerar_grafico_progresso,
     gerar_analise_estatistica,
-    exportar_dados,
-    fazer_backup
+    gerar_indicadores_dashboard,
+    carregar_medicoes_periodo,
+    calcular_estatisticas_medicoes,
+    calcular_tendencias,
+    ajustar_tendencia,
+    reduzir_pontos,
+    PONTOS_GRAFICO,
+    exportar_dados
 )
+from backup import obter_agendador, listar_backups, ler_manifesto, restaurar_backup
+from banco import carregar_config, obter_gerenciador, obter_cache
+from protocolos import importar_protocolos, conteudo_protocolo
+from medicoes import TIPOS_MEDICAO, DIRETORIO_MEDICOES, importar_medicoes
+import consultas
 
 # Configuração da página
 st.set_page_config(
@@ -24,69 +33,39 @@ st.set_page_config(
 )
 
 # Carrega configurações
-with open('config.yaml', 'r') as f:
-    config = yaml.safe_load(f)
+config = carregar_config()
+
+# Inicia, uma única vez por processo, o agendador dos backups automáticos
+obter_agendador()
 
 # Conexão com o banco de dados
 def get_db_connection():
+    """Retorna o cursor da sessão sobre a conexão compartilhada do processo"""
     try:
         # Verifica se o arquivo de configuração existe
         if not os.path.exists('config.yaml'):
             st.error("Arquivo de configuração não encontrado!")
             return None
-            
-        # Carrega as configurações
-        with open('config.yaml', 'r') as f:
-            config = yaml.safe_load(f)
-            
-        # Remove o banco de dados existente se houver problemas
-        if os.path.exists(config['database']['path']):
-            try:
-                conn = duckdb.connect(config['database']['path'])
-                # Testa a conexão
-                conn.execute("SELECT 1")
-            except:
-                os.remove(config['database']['path'])
-                st.warning("Banco de dados corrompido. Criando novo banco...")
-        
-        # Conecta ao banco de dados
-        conn = duckdb.connect(config['database']['path'])
-        
-        # Verifica se as tabelas existem
-        tabelas = conn.execute("""
-            SELECT name 
-            FROM sqlite_master 
-            WHERE type='table'
-        """).fetchall()
-        
-        tabelas_existentes = [t[0] for t in tabelas]
-        tabelas_necessarias = ['fases_reabilitacao', 'pacientes', 'progresso']
-        
-        # Se alguma tabela necessária não existir, cria todas as tabelas
-        if not all(tabela in tabelas_existentes for tabela in tabelas_necessarias):
-            st.warning("Tabelas não encontradas. Criando estrutura do banco de dados...")
-            with open('schema.sql', 'r') as f:
-                sql_commands = f.read().split(';')
-                for command in sql_commands:
-                    if command.strip():
-                        try:
-                            conn.execute(command)
-                        except Exception as e:
-                            st.warning(f"Erro ao executar comando SQL: {str(e)}")
-            
-        return conn
+
+        gerenciador = obter_gerenciador()
+
+        # Reaproveita o cursor da sessão entre as reexecuções do Streamlit,
+        # desde que o banco não tenha sido substituído por uma restauração
+        if (st.session_state.get('db_cursor') is not None
+                and st.session_state.get('db_geracao') == gerenciador.geracao):
+            gerenciador.registrar_reutilizacao()
+            return st.session_state.db_cursor
+
+        for aviso in gerenciador.avisos:
+            st.warning(aviso)
+
+        st.session_state.db_cursor = gerenciador.cursor()
+        st.session_state.db_geracao = gerenciador.geracao
+        return st.session_state.db_cursor
     except Exception as e:
         st.error(f"Erro ao conectar com o banco de dados: {str(e)}")
         return None
 
-# Função para obter o próximo ID disponível
-def get_next_id(conn, table_name):
-    try:
-        result = conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table_name}").fetchone()
-        return int(result[0]) if result else 1
-    except:
-        return 1
-
 # Função para verificar credenciais
 def verificar_credenciais(username, password):
     credenciais = {
@@ -96,13 +75,6 @@ def verificar_credenciais(username, password):
     }
     return username in credenciais and credenciais[username] == password
 
-# Função para criar o botão de download
-def get_binary_file_downloader_html(file_path, file_label='File'):
-    with open(file_path, 'rb') as f:
-        data = f.read()
-    b64 = base64.b64encode(data).decode()
-    return f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{os.path.basename(file_path)}">Clique aqui para baixar {file_label}</a>'
-
 # Inicialização do estado da sessão
 if 'autenticado' not in st.session_state:
     st.session_state.autenticado = False
@@ -113,7 +85,7 @@ if 'paciente_selecionado' not in st.session_state:
 if st.session_state.autenticado:
     pagina = st.sidebar.radio(
         "Navegação",
-        ["Dashboard", "Pacientes", "Protocolos", "Análise de Dados", "Relatórios", "Backup"]
+        ["Dashboard", "Pacientes", "Protocolos", "Visualização de Dados", "Análise de Dados", "Relatórios", "Backup"]
     )
 else:
     pagina = "Login"
@@ -146,40 +118,27 @@ elif pagina == "Dashboard":
     # Conexão com o banco de dados
     conn = get_db_connection()
     
-    # Estatísticas gerais
+    # Estatísticas gerais (uma única consulta, memorizada até a próxima escrita)
+    cache = obter_cache()
+    indicadores = gerar_indicadores_dashboard(conn, cache)
     col1, col2, col3 = st.columns(3)
     with col1:
-        total_pacientes = conn.execute("SELECT COUNT(*) FROM pacientes").fetchone()[0]
-        st.metric("Total de Pacientes", total_pacientes)
+        st.metric("Total de Pacientes", indicadores["total_pacientes"])
     with col2:
-        pacientes_ativos = conn.execute("SELECT COUNT(*) FROM progresso WHERE data_fim IS NULL").fetchone()[0]
-        st.metric("Pacientes Ativos", pacientes_ativos)
+        st.metric("Pacientes Ativos", indicadores["pacientes_ativos"])
     with col3:
-        pacientes_concluidos = conn.execute("SELECT COUNT(*) FROM progresso WHERE data_fim IS NOT NULL").fetchone()[0]
-        st.metric("Pacientes Concluídos", pacientes_concluidos)
+        st.metric("Pacientes Concluídos", indicadores["pacientes_concluidos"])
     
     # Gráfico de progresso por fase
     st.subheader("Progresso por Fase")
-    progresso_fases = conn.execute("""
-        SELECT f.fase, COUNT(*) as total
-        FROM progresso p
-        JOIN fases_reabilitacao f ON p.fase = f.id
-        GROUP BY f.fase
-    """).fetchdf()
+    progresso_fases = indicadores["progresso_fases"]
     
     fig = px.bar(progresso_fases, x='fase', y='total', title='Pacientes por Fase')
     st.plotly_chart(fig)
     
     # Lista de pacientes recentes
     st.subheader("Pacientes Recentes")
-    pacientes_recentes = conn.execute("""
-        SELECT p.nome, p.data_cirurgia, f.fase, pr.status
-        FROM pacientes p
-        JOIN progresso pr ON p.id = pr.paciente_id
-        JOIN fases_reabilitacao f ON pr.fase = f.id
-        ORDER BY pr.data_inicio DESC
-        LIMIT 5
-    """).fetchdf()
+    pacientes_recentes = cache.executar(conn, 'pacientes_recentes')
     
     st.dataframe(pacientes_recentes)
 
@@ -204,21 +163,16 @@ elif pagina == "Pacientes":
             
             if st.form_submit_button("Cadastrar"):
                 try:
-                    # Obtém o próximo ID disponível
-                    next_id = get_next_id(conn, 'pacientes')
-                    
-                    # Insere o novo paciente
-                    conn.execute("""
-                        INSERT INTO pacientes (id, nome, data_cirurgia, data_cadastro)
-                        VALUES (?, ?, ?, ?)
-                    """, (next_id, nome, data_cirurgia, data_cadastro))
+                    # Insere o novo paciente (o ID vem da sequência seq_pacientes)
+                    consultas.executar(conn, 'inserir_paciente', (nome, data_cirurgia, data_cadastro))
+                    obter_cache().invalidar()
                     st.success("Paciente cadastrado com sucesso!")
                 except Exception as e:
                     st.error(f"Erro ao cadastrar paciente: {str(e)}")
     
     # Lista de pacientes
     st.subheader("Lista de Pacientes")
-    pacientes = conn.execute("SELECT * FROM pacientes").fetchdf()
+    pacientes = consultas.executar(conn, 'pacientes').fetchdf()
     st.dataframe(pacientes)
     
     # Seleção de paciente para detalhes
@@ -234,13 +188,10 @@ elif pagina == "Pacientes":
             
             # Detalhes do paciente
             st.subheader(f"Detalhes do Paciente: {paciente_selecionado}")
-            progresso_paciente = conn.execute("""
-                SELECT f.fase, p.data_inicio, p.data_fim, p.status, p.observacoes
-                FROM progresso p
-                JOIN fases_reabilitacao f ON p.fase = f.id
-                WHERE p.paciente_id = ?
-                ORDER BY p.data_inicio
-            """, (int(paciente_id),)).fetchdf()
+            progresso_paciente = carregar_progresso_paciente(paciente_id, conn, obter_cache())
+            progresso_paciente = progresso_paciente[
+                ['nome_fase', 'data_inicio', 'data_fim', 'status', 'observacoes']
+            ].rename(columns={'nome_fase': 'fase'})
             
             st.dataframe(progresso_paciente)
             
@@ -258,12 +209,13 @@ elif pagina == "Pacientes":
                     if st.form_submit_button("Atualizar"):
                         try:
                             fase_id = int(fase.split(" - ")[0])
-                            next_id = get_next_id(conn, 'progresso')
                             
-                            conn.execute("""
-                                INSERT INTO progresso (id, paciente_id, fase, data_inicio, status, observacoes)
-                                VALUES (?, ?, ?, ?, ?, ?)
-                            """, (next_id, int(paciente_id), fase_id, data_inicio, status, observacoes))
+                            # O ID vem da sequência seq_progresso
+                            consultas.executar(
+                                conn, 'inserir_progresso',
+                                (int(paciente_id), fase_id, data_inicio, status, observacoes)
+                            )
+                            obter_cache().invalidar()
                             st.success("Progresso atualizado com sucesso!")
                         except Exception as e:
                             st.error(f"Erro ao atualizar progresso: {str(e)}")
@@ -299,6 +251,37 @@ elif pagina == "Análise de Dados":
     
     fig_sucesso = px.bar(sucesso_fase, x='fase', y='taxa_sucesso', title='Taxa de Sucesso por Fase')
     st.plotly_chart(fig_sucesso)
+    
+    # Tendência das medições de todos os pacientes
+    st.subheader("Tendência das Medições")
+    tendencias = calcular_tendencias(conn, obter_cache())
+    
+    if tendencias.empty:
+        st.info("Nenhuma medição registrada.")
+    else:
+        tipo_tendencia = st.selectbox("Tipo de Medição", list(TIPOS_MEDICAO.values()), key="tipo_tendencia")
+        apenas_significativas = st.checkbox("Apenas tendências significativas (IC 95% sem o zero)")
+        
+        ranking = tendencias[tendencias['tipo'] == tipo_tendencia]
+        if apenas_significativas:
+            ranking = ranking[ranking['significativa']]
+        ranking = ranking.sort_values('melhora_semanal', ascending=False)
+        
+        st.write("Pacientes ordenados pela melhora semanal")
+        st.dataframe(
+            ranking[['nome', 'n', 'melhora_semanal', 'inclinacao', 'ic_inferior', 'ic_superior', 'r2', 'ultima_data']]
+            .rename(columns={
+                'nome': 'Paciente',
+                'n': 'Medições',
+                'melhora_semanal': 'Melhora Semanal',
+                'inclinacao': 'Inclinação (por dia)',
+                'ic_inferior': 'IC 95% Inferior',
+                'ic_superior': 'IC 95% Superior',
+                'r2': 'R²',
+                'ultima_data': 'Última Medição'
+            }),
+            hide_index=True
+        )
 
 # Página de Relatórios
 elif pagina == "Relatórios":
@@ -312,7 +295,7 @@ elif pagina == "Relatórios":
     conn = get_db_connection()
     
     # Seleção de paciente para relatório
-    pacientes = conn.execute("SELECT id, nome FROM pacientes").fetchdf()
+    pacientes = consultas.executar(conn, 'lista_pacientes').fetchdf()
     paciente_selecionado = st.selectbox(
         "Selecione um paciente para gerar relatório",
         pacientes['nome'].tolist()
@@ -321,8 +304,11 @@ elif pagina == "Relatórios":
     if paciente_selecionado:
         paciente_id = pacientes[pacientes['nome'] == paciente_selecionado]['id'].iloc[0]
         
+        # Carrega o progresso uma única vez para o relatório e os gráficos
+        progresso = carregar_progresso_paciente(paciente_id, conn, obter_cache())
+        
         # Gera relatório
-        relatorio = gerar_relatorio_paciente(paciente_id, conn)
+        relatorio = gerar_relatorio_paciente(paciente_id, conn, progresso)
         
         # Exibe relatório
         st.subheader("Dados do Paciente")
@@ -332,7 +318,7 @@ elif pagina == "Relatórios":
         st.dataframe(pd.DataFrame(relatorio["Progresso"]))
         
         # Gráficos de progresso
-        fig_fases, fig_tempo = gerar_grafico_progresso(paciente_id, conn)
+        fig_fases, fig_tempo = gerar_grafico_progresso(paciente_id, conn, progresso)
         st.plotly_chart(fig_fases)
         st.plotly_chart(fig_tempo)
         
@@ -354,16 +340,91 @@ elif pagina == "Backup":
     
     # Seção de backup
     st.subheader("Realizar Backup")
+    agendador = obter_agendador()
+    tipo_backup = st.radio("Tipo de Backup", ["completo", "incremental"], horizontal=True)
     if st.button("Fazer Backup Agora"):
-        backup_path = fazer_backup(conn)
-        st.success(f"Backup realizado com sucesso! Arquivo salvo em: {backup_path}")
+        posicao = agendador.solicitar(tipo_backup)
+        st.success(f"Backup enfileirado (posição {posicao}). Ele será feito em segundo plano.")
+    
+    # Situação do agendador de backups
+    status_backup = agendador.status()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Último Backup", status_backup['ultimo_inicio'] or "-")
+    with col2:
+        duracao = status_backup['ultima_duracao_s']
+        st.metric("Duração", f"{duracao:.2f} s" if duracao is not None else "-")
+    with col3:
+        st.metric("Backups na Fila", status_backup['pendentes'])
+    if status_backup['em_execucao']:
+        st.info(f"Backup {status_backup['ultimo_tipo']} em andamento...")
+    elif status_backup['ultimo_resultado'] == 'sucesso':
+        st.success(f"Último backup concluído: {status_backup['ultimo_caminho']}")
+    elif status_backup['ultimo_resultado']:
+        st.error(f"Último backup falhou: {status_backup['ultimo_resultado']}")
+    if status_backup['proximo_agendado']:
+        st.caption(f"Próximo backup automático: {status_backup['proximo_agendado']}")
+    st.button("Atualizar Situação")
+    
+    # Seção de status da conexão
+    st.subheader("Status da Conexão")
+    estatisticas_conexao = obter_gerenciador().estatisticas()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Cursores Criados", estatisticas_conexao['cursores_criados'])
+    with col2:
+        st.metric("Reutilização", f"{estatisticas_conexao['taxa_reutilizacao']:.1f}%")
+    with col3:
+        st.metric("Tempo Médio de Obtenção", f"{estatisticas_conexao['tempo_medio_obtencao_ms']:.3f} ms")
+    
+    estatisticas_cache = obter_cache().estatisticas()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Acertos do Cache", estatisticas_cache['acertos'])
+    with col2:
+        st.metric("Consultas ao Banco", estatisticas_cache['falhas'])
+    with col3:
+        st.metric("Versão dos Dados", estatisticas_cache['versao'])
     
     # Seção de exportação
     st.subheader("Exportar Dados")
-    formato = st.selectbox("Formato de Exportação", ["excel", "csv"])
+    formato = st.selectbox("Formato de Exportação", ["excel", "csv", "parquet", "feather"])
+    particionar_por = None
+    if formato == "parquet":
+        particoes = {"Sem partição": None, "Fase": "fase", "Ano de início": "ano"}
+        particionar_por = particoes[st.selectbox("Particionar progresso por", list(particoes))]
     if st.button("Exportar Dados"):
-        export_path = exportar_dados(conn, formato)
-        st.success(f"Dados exportados com sucesso! Arquivo salvo em: {export_path}")
+        barra_progresso = st.progress(0.0, text="Iniciando exportação...")
+        try:
+            caminhos = exportar_dados(
+                conn, formato,
+                ao_progredir=lambda fracao, mensagem: barra_progresso.progress(fracao, text=mensagem),
+                particionar_por=particionar_por
+            )
+            st.success(f"Dados exportados com sucesso! Arquivo salvo em: {', '.join(caminhos)}")
+        except Exception as e:
+            st.error(f"Erro ao exportar dados: {str(e)}")
+    
+    # Seção de restauração (por último, pois fecha a conexão da sessão)
+    st.subheader("Restaurar Backup")
+    backups = listar_backups()
+    if not backups:
+        st.info("Nenhum backup disponível.")
+    else:
+        opcoes_backup = {
+            f"{os.path.basename(caminho)} ({ler_manifesto(caminho)['tipo']})": caminho
+            for caminho in backups
+        }
+        backup_selecionado = opcoes_backup[st.selectbox("Backup", list(opcoes_backup))]
+        manifesto = ler_manifesto(backup_selecionado)
+        st.write(f"Criado em {manifesto['criado_em']} com os registros:")
+        st.json(manifesto['registros'])
+        if st.button("Restaurar Backup"):
+            try:
+                duracao = restaurar_backup(backup_selecionado)
+                st.success(f"Backup restaurado com sucesso em {duracao:.2f} s!")
+            except Exception as e:
+                st.error(f"Erro ao restaurar backup: {str(e)}")
 
 # Página de Protocolos
 elif pagina == "Protocolos":
@@ -388,15 +449,55 @@ elif pagina == "Protocolos":
         else:
             st.success(f"Encontrados {len(arquivos)} protocolos disponíveis!")
             
-            # Divide os protocolos em duas colunas
-            col1, col2 = st.columns(2)
+            # Sincroniza o banco com as planilhas (só as alteradas são lidas)
+            conn = get_db_connection()
+            cache = obter_cache()
+            try:
+                resumo = importar_protocolos(conn)
+                if resumo['importados'] or resumo['removidos']:
+                    cache.invalidar()
+                    st.info(f"{len(resumo['importados'])} protocolo(s) importado(s) e "
+                            f"{len(resumo['removidos'])} removido(s).")
+                for arquivo, erro in resumo['erros'].items():
+                    st.warning(f"Não foi possível ler {arquivo}: {erro}")
+            except Exception as e:
+                st.error(f"Erro ao sincronizar os protocolos: {str(e)}")
             
-            for i, arquivo in enumerate(arquivos):
-                col = col1 if i % 2 == 0 else col2
-                with col.expander(arquivo):
-                    file_path = os.path.join('planilhas_originais', arquivo)
-                    st.markdown(get_binary_file_downloader_html(file_path, arquivo), unsafe_allow_html=True)
-                    st.info("Após baixar, abra o arquivo com o Excel ou outro programa compatível.")
+            # Consulta do conteúdo de um protocolo
+            protocolos = cache.executar(conn, 'protocolos')
+            if not protocolos.empty:
+                opcoes_protocolos = {
+                    protocolo.arquivo: protocolo for protocolo in protocolos.itertuples(index=False)
+                }
+                protocolo_selecionado = st.selectbox("Selecione o protocolo", list(opcoes_protocolos))
+                protocolo = opcoes_protocolos[protocolo_selecionado]
+                protocolo_id = int(protocolo.id)
+                
+                # Só a planilha selecionada é enviada, e apenas quando o botão é clicado
+                st.download_button(
+                    "Baixar planilha",
+                    data=conteudo_protocolo(os.path.join('planilhas_originais', protocolo.arquivo), protocolo.hash),
+                    file_name=protocolo.arquivo,
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+                st.caption("Após baixar, abra o arquivo com o Excel ou outro programa compatível.")
+                
+                aba_fases, aba_exercicios, aba_criterios = st.tabs(["Fases", "Exercícios", "Critérios"])
+                with aba_fases:
+                    fases = cache.executar(conn, 'fases_protocolo', (protocolo_id,))
+                    fases.columns = ['Ordem', 'Fase', 'Duração', 'Microciclo Inicial', 'Microciclo Final']
+                    st.dataframe(fases, hide_index=True)
+                with aba_exercicios:
+                    exercicios = cache.executar(conn, 'exercicios_protocolo', (protocolo_id,))
+                    area = st.selectbox("Área", ["Todas"] + list(exercicios['area'].unique()))
+                    if area != "Todas":
+                        exercicios = exercicios[exercicios['area'] == area]
+                    exercicios.columns = ['Área', 'Exercício', 'Fase', 'Microciclo', 'Prescrição']
+                    st.dataframe(exercicios, hide_index=True)
+                with aba_criterios:
+                    criterios = cache.executar(conn, 'criterios_protocolo', (protocolo_id,))
+                    criterios.columns = ['Critério', 'Microciclo', 'Descrição']
+                    st.dataframe(criterios, hide_index=True)
 
 # Página de Visualização de Dados
 elif pagina == "Visualização de Dados":
@@ -407,7 +508,31 @@ elif pagina == "Visualização de Dados":
         st.session_state.autenticado = False
         st.rerun()
     
-    # Código original para visualização de dados
+    conn = get_db_connection()
+    cache = obter_cache()
+    
+    # Seleção do paciente
+    pacientes = cache.executar(conn, 'lista_pacientes')
+    if pacientes.empty:
+        st.warning("Cadastre um paciente para registrar medições.")
+        st.stop()
+    paciente_selecionado = st.selectbox("Selecione o paciente", pacientes['nome'].tolist())
+    paciente_id = int(pacientes[pacientes['nome'] == paciente_selecionado]['id'].iloc[0])
+    
+    # Importação das planilhas de dados_atletas para o paciente
+    if cache.executar(conn, 'contagem_medicoes', (paciente_id,), formato='one')[0] == 0:
+        st.info("Nenhuma medição registrada para este paciente.")
+        if os.path.exists(DIRETORIO_MEDICOES) and st.button("Importar planilhas de dados_atletas"):
+            try:
+                resumo = importar_medicoes(conn, paciente_id)
+                cache.invalidar()
+                st.success(f"{sum(resumo['inseridas'].values())} medições importadas!")
+                for arquivo, erro in resumo['erros'].items():
+                    st.warning(f"Não foi possível ler {arquivo}: {erro}")
+            except Exception as e:
+                cache.invalidar()
+                st.error(f"Erro ao importar as medições: {str(e)}")
+    
     st.subheader("Selecione as datas para análise")
     
     # Seleção de datas
@@ -420,145 +545,132 @@ elif pagina == "Visualização de Dados":
     # Seleção do tipo de análise
     tipo_analise = st.selectbox(
         "Tipo de Análise",
-        ["Força Muscular", "Amplitude de Movimento", "Dor", "Edema", "Todos os Dados"]
+        list(TIPOS_MEDICAO.values()) + ["Todos os Dados"]
+    )
+    
+    resolucao_completa = st.checkbox(
+        "Resolução completa nos gráficos",
+        help=f"Sem esta opção, cada série é reduzida a até {PONTOS_GRAFICO} pontos, preservando o formato da curva."
     )
     
     # Botão para carregar dados
     if st.button("Carregar Dados"):
         try:
             if tipo_analise == "Todos os Dados":
-                # Carrega todos os arquivos de dados
-                dados_combinados = pd.DataFrame()
-                tipos = ["forca_muscular", "amplitude_de_movimento", "dor", "edema"]
+                # Carrega as medições de todos os tipos em uma única consulta
+                dados_filtrados = carregar_medicoes_periodo(paciente_id, data_inicio, data_fim, conn, cache)
                 
-                for tipo in tipos:
-                    arquivo = f"dados_{tipo}.xlsx"
-                    caminho_arquivo = os.path.join('dados_atletas', arquivo)
+                if not dados_filtrados.empty:
+                    # Uma coluna por tipo, usada pelos dois gráficos
+                    valores_por_tipo = dados_filtrados.pivot(index='Data', columns='Tipo', values='Valor')
+                    if not resolucao_completa:
+                        valores_por_tipo = reduzir_pontos(valores_por_tipo)
                     
-                    if os.path.exists(caminho_arquivo):
-                        df = pd.read_excel(caminho_arquivo)
-                        df['Data'] = pd.to_datetime(df['Data'])
-                        df['Tipo'] = tipo.replace('_', ' ').title()
-                        dados_combinados = pd.concat([dados_combinados, df])
-                
-                if not dados_combinados.empty:
-                    # Filtra os dados pelo período selecionado
-                    dados_filtrados = dados_combinados[
-                        (dados_combinados['Data'].dt.date >= data_inicio) & 
-                        (dados_combinados['Data'].dt.date <= data_fim)
-                    ]
+                    # Gráfico de linha para todos os tipos
+                    st.subheader("Evolução de Todos os Parâmetros")
+                    st.line_chart(valores_por_tipo)
                     
-                    if not dados_filtrados.empty:
-                        # Gráfico de linha para todos os tipos
-                        st.subheader("Evolução de Todos os Parâmetros")
-                        st.line_chart(dados_filtrados.pivot(index='Data', columns='Tipo', values='Valor'))
-                        
-                        # Gráfico de área para visualização do progresso
-                        st.subheader("Progresso da Reabilitação")
-                        st.area_chart(dados_filtrados.pivot(index='Data', columns='Tipo', values='Valor'))
-                        
-                        # Tabela de dados
-                        st.subheader("Dados Detalhados")
-                        st.dataframe(dados_filtrados)
-                        
-                        # Estatísticas por tipo
-                        st.subheader("Estatísticas por Tipo de Análise")
-                        tipos_unicos = dados_filtrados['Tipo'].unique()
-                        for tipo in tipos_unicos:
-                            dados_tipo = dados_filtrados[dados_filtrados['Tipo'] == tipo]
-                            st.write(f"**{tipo}**")
-                            col1, col2, col3, col4 = st.columns(4)
-                            with col1:
-                                st.metric("Média", f"{dados_tipo['Valor'].mean():.2f}")
-                            with col2:
-                                st.metric("Máximo", f"{dados_tipo['Valor'].max():.2f}")
-                            with col3:
-                                st.metric("Mínimo", f"{dados_tipo['Valor'].min():.2f}")
-                            with col4:
-                                variacao = ((dados_tipo['Valor'].iloc[-1] - dados_tipo['Valor'].iloc[0]) / dados_tipo['Valor'].iloc[0]) * 100
-                                st.metric("Variação %", f"{variacao:.2f}%")
-                    else:
-                        st.warning("Não há dados disponíveis para o período selecionado.")
-                else:
-                    st.error("Nenhum arquivo de dados encontrado.")
-            else:
-                # Carrega os dados do arquivo Excel correspondente
-                arquivo = f"dados_{tipo_analise.lower().replace(' ', '_')}.xlsx"
-                caminho_arquivo = os.path.join('dados_atletas', arquivo)
-                
-                if os.path.exists(caminho_arquivo):
-                    df = pd.read_excel(caminho_arquivo)
-                    df['Data'] = pd.to_datetime(df['Data'])
+                    # Gráfico de área para visualização do progresso
+                    st.subheader("Progresso da Reabilitação")
+                    st.area_chart(valores_por_tipo)
                     
-                    # Filtra os dados pelo período selecionado
-                    df_filtrado = df[(df['Data'].dt.date >= data_inicio) & (df['Data'].dt.date <= data_fim)]
+                    # Tabela de dados
+                    st.subheader("Dados Detalhados")
+                    st.dataframe(dados_filtrados)
                     
-                    if not df_filtrado.empty:
-                        # Gráfico de linha
-                        st.subheader(f"Evolução da {tipo_analise}")
-                        st.line_chart(df_filtrado.set_index('Data'))
-                        
-                        # Gráfico de barras
-                        st.subheader(f"Distribuição da {tipo_analise}")
-                        st.bar_chart(df_filtrado.set_index('Data'))
-                        
-                        # Gráfico de área
-                        st.subheader(f"Progresso da {tipo_analise}")
-                        st.area_chart(df_filtrado.set_index('Data'))
-                        
-                        # Tabela de dados
-                        st.subheader("Dados Detalhados")
-                        st.dataframe(df_filtrado)
-                        
-                        # Estatísticas
-                        st.subheader("Estatísticas")
+                    # Estatísticas por tipo
+                    st.subheader("Estatísticas por Tipo de Análise")
+                    estatisticas = calcular_estatisticas_medicoes(dados_filtrados)
+                    for tipo, estatistica in estatisticas.iterrows():
+                        st.write(f"**{tipo}**")
                         col1, col2, col3, col4 = st.columns(4)
                         with col1:
-                            st.metric("Média", f"{df_filtrado['Valor'].mean():.2f}")
+                            st.metric("Média", f"{estatistica['media']:.2f}")
                         with col2:
-                            st.metric("Máximo", f"{df_filtrado['Valor'].max():.2f}")
+                            st.metric("Máximo", f"{estatistica['maximo']:.2f}")
                         with col3:
-                            st.metric("Mínimo", f"{df_filtrado['Valor'].min():.2f}")
+                            st.metric("Mínimo", f"{estatistica['minimo']:.2f}")
                         with col4:
-                            variacao = ((df_filtrado['Valor'].iloc[-1] - df_filtrado['Valor'].iloc[0]) / df_filtrado['Valor'].iloc[0]) * 100
-                            st.metric("Variação %", f"{variacao:.2f}%")
-                            
-                        # Análise de tendência
-                        st.subheader("Análise de Tendência")
-                        df_filtrado['Dia'] = range(len(df_filtrado))
-                        coeficiente = df_filtrado['Valor'].corr(df_filtrado['Dia'])
-                        if coeficiente > 0:
-                            st.success(f"Tendência positiva (coeficiente: {coeficiente:.2f})")
-                        elif coeficiente < 0:
-                            st.warning(f"Tendência negativa (coeficiente: {coeficiente:.2f})")
-                        else:
-                            st.info("Sem tendência clara")
-                            
-                        # Recomendações baseadas nos dados
-                        st.subheader("Recomendações")
-                        if tipo_analise == "Força Muscular":
-                            if df_filtrado['Valor'].mean() < 70:
-                                st.warning("Força muscular abaixo do esperado. Recomenda-se intensificar os exercícios de fortalecimento.")
-                            else:
-                                st.success("Força muscular dentro do esperado. Continue com o protocolo atual.")
-                        elif tipo_analise == "Amplitude de Movimento":
-                            if df_filtrado['Valor'].mean() < 60:
-                                st.warning("Amplitude de movimento limitada. Recomenda-se focar em exercícios de flexibilidade.")
-                            else:
-                                st.success("Amplitude de movimento adequada. Continue com o protocolo atual.")
-                        elif tipo_analise == "Dor":
-                            if df_filtrado['Valor'].mean() > 5:
-                                st.warning("Nível de dor elevado. Recomenda-se ajustar a intensidade dos exercícios.")
-                            else:
-                                st.success("Nível de dor controlado. Continue com o protocolo atual.")
-                        elif tipo_analise == "Edema":
-                            if df_filtrado['Valor'].mean() > 3:
-                                st.warning("Edema persistente. Recomenda-se intensificar a crioterapia e elevação do membro.")
-                            else:
-                                st.success("Edema controlado. Continue com o protocolo atual.")
+                            st.metric("Variação %", f"{estatistica['variacao']:.2f}%")
+                else:
+                    st.warning("Não há dados disponíveis para o período selecionado.")
+            else:
+                # Carrega as medições do tipo selecionado (período filtrado no banco)
+                tipo = next(t for t, rotulo in TIPOS_MEDICAO.items() if rotulo == tipo_analise)
+                df_filtrado = cache.executar(conn, 'medicoes_periodo', (paciente_id, tipo, data_inicio, data_fim))
+                df_filtrado.columns = ['Data', 'Valor']
+                
+                if not df_filtrado.empty:
+                    # Série usada pelos três gráficos
+                    dados_grafico = df_filtrado.set_index('Data')
+                    if not resolucao_completa:
+                        dados_grafico = reduzir_pontos(dados_grafico)
+                    
+                    # Gráfico de linha
+                    st.subheader(f"Evolução da {tipo_analise}")
+                    st.line_chart(dados_grafico)
+                    
+                    # Gráfico de barras
+                    st.subheader(f"Distribuição da {tipo_analise}")
+                    st.bar_chart(dados_grafico)
+                    
+                    # Gráfico de área
+                    st.subheader(f"Progresso da {tipo_analise}")
+                    st.area_chart(dados_grafico)
+                    
+                    # Tabela de dados
+                    st.subheader("Dados Detalhados")
+                    st.dataframe(df_filtrado)
+                    
+                    # Estatísticas
+                    st.subheader("Estatísticas")
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Média", f"{df_filtrado['Valor'].mean():.2f}")
+                    with col2:
+                        st.metric("Máximo", f"{df_filtrado['Valor'].max():.2f}")
+                    with col3:
+                        st.metric("Mínimo", f"{df_filtrado['Valor'].min():.2f}")
+                    with col4:
+                        variacao = ((df_filtrado['Valor'].iloc[-1] - df_filtrado['Valor'].iloc[0]) / df_filtrado['Valor'].iloc[0]) * 100
+                        st.metric("Variação %", f"{variacao:.2f}%")
+                        
+                    # Análise de tendência
+                    st.subheader("Análise de Tendência")
+                    tendencia = ajustar_tendencia(df_filtrado)
+                    descricao = (f"inclinação: {tendencia['inclinacao']:.3f} por dia, "
+                                 f"IC 95%: {tendencia['ic_inferior']:.3f} a {tendencia['ic_superior']:.3f}, "
+                                 f"R²: {tendencia['r2']:.2f}")
+                    if tendencia['ic_inferior'] > 0:
+                        st.success(f"Tendência positiva ({descricao})")
+                    elif tendencia['ic_superior'] < 0:
+                        st.warning(f"Tendência negativa ({descricao})")
                     else:
-                        st.warning("Não há dados disponíveis para o período selecionado.")
+                        st.info("Sem tendência clara")
+                        
+                    # Recomendações baseadas nos dados
+                    st.subheader("Recomendações")
+                    if tipo_analise == "Força Muscular":
+                        if df_filtrado['Valor'].mean() < 70:
+                            st.warning("Força muscular abaixo do esperado. Recomenda-se intensificar os exercícios de fortalecimento.")
+                        else:
+                            st.success("Força muscular dentro do esperado. Continue com o protocolo atual.")
+                    elif tipo_analise == "Amplitude de Movimento":
+                        if df_filtrado['Valor'].mean() < 60:
+                            st.warning("Amplitude de movimento limitada. Recomenda-se focar em exercícios de flexibilidade.")
+                        else:
+                            st.success("Amplitude de movimento adequada. Continue com o protocolo atual.")
+                    elif tipo_analise == "Dor":
+                        if df_filtrado['Valor'].mean() > 5:
+                            st.warning("Nível de dor elevado. Recomenda-se ajustar a intensidade dos exercícios.")
+                        else:
+                            st.success("Nível de dor controlado. Continue com o protocolo atual.")
+                    elif tipo_analise == "Edema":
+                        if df_filtrado['Valor'].mean() > 3:
+                            st.warning("Edema persistente. Recomenda-se intensificar a crioterapia e elevação do membro.")
+                        else:
+                            st.success("Edema controlado. Continue com o protocolo atual.")
                 else:
-                    st.error(f"Arquivo de dados não encontrado: {arquivo}")
+                    st.warning("Não há dados disponíveis para o período selecionado.")
         except Exception as e:
             st.error(f"Erro ao carregar dados: {str(e)}") 
\ No newline at end of file
@@ -1,3 +1,7 @@
+-- Sequências para geração dos IDs
+CREATE SEQUENCE IF NOT EXISTS seq_pacientes START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_progresso START 1;
+
 -- Criação das tabelas
 CREATE TABLE IF NOT EXISTS fases_reabilitacao (
     id INTEGER PRIMARY KEY,
@@ -6,14 +10,14 @@ CREATE TABLE IF NOT EXISTS fases_reabilitacao (
 );
 
 CREATE TABLE IF NOT EXISTS pacientes (
-    id INTEGER PRIMARY KEY,
+    id INTEGER PRIMARY KEY DEFAULT nextval('seq_pacientes'),
     nome TEXT NOT NULL,
     data_cirurgia DATE,
     data_cadastro DATE
 );
 
 CREATE TABLE IF NOT EXISTS progresso (
-    id INTEGER PRIMARY KEY,
+    id INTEGER PRIMARY KEY DEFAULT nextval('seq_progresso'),
     paciente_id INTEGER,
     fase INTEGER,
     data_inicio DATE,
@@ -25,7 +29,7 @@ CREATE TABLE IF NOT EXISTS progresso (
 );
 
 -- Inserção das fases de reabilitação
-INSERT INTO fases_reabilitacao (id, fase, descricao) VALUES
+INSERT OR IGNORE INTO fases_reabilitacao (id, fase, descricao) VALUES
 (1, 'Fase 1 - Proteção', 'Proteção da área lesionada, controle de dor e edema'),
 (2, 'Fase 2 - Mobilidade', 'Restauração da amplitude de movimento'),
 (3, 'Fase 3 - Força', 'Ganho de força muscular'),